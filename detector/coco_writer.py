@@ -0,0 +1,116 @@
+import os
+import json
+
+COCO_CATEGORIES = [
+    {"id": 1, "name": "Elephant", "supercategory": "", "color": "#3ab7dd", "metadata": {}, "keypoint_colors": []}
+]
+
+
+class CocoWriter:
+    """Writes COCO annotations incrementally. Each image is appended as one line to a progress file,
+    which is turned into the COCO json when the writer is closed."""
+
+    def __init__(self, output_path, resume=False, flush_every=8):
+        """
+        Initializes the CocoWriter.
+
+        Parameters:
+        - output_path (str): Path to the COCO json file.
+        - resume (bool, optional): Continue an interrupted run from its progress file instead of starting over.
+        - flush_every (int, optional): Number of images written between flushes of the progress file.
+        """
+        self.output_path = output_path
+        self.part_path = output_path + '.part'
+        self.flush_every = flush_every
+        self.done = set()
+        self.next_image_id = 1
+        self.next_annotation_id = 1
+        if resume and os.path.exists(self.part_path):
+            self._read_progress()
+        elif os.path.exists(self.part_path):
+            os.remove(self.part_path)
+        self.file = open(self.part_path, 'a', encoding='utf-8')
+        self.pending = 0
+
+    def _read_progress(self):
+        """
+        Reads the images already written by an interrupted run and cuts off a partially written last line.
+        """
+        valid_bytes = 0
+        with open(self.part_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid_bytes += len(line)
+                image = record['image']
+                self.done.add(image['path'])
+                self.next_image_id = max(self.next_image_id, image['id'] + 1)
+                for annotation in record['annotations']:
+                    self.next_annotation_id = max(self.next_annotation_id, annotation['id'] + 1)
+        with open(self.part_path, 'r+b') as f:
+            f.truncate(valid_bytes)
+
+    def is_done(self, path):
+        """
+        Checks whether an image was already written.
+
+        Parameters:
+        - path (str): Path of the image as stored in its metadata.
+        """
+        return path in self.done
+
+    def write(self, image, annotations):
+        """
+        Appends one image with its annotations.
+
+        Parameters:
+        - image (dict): COCO image record.
+        - annotations (list): COCO annotation records of the image.
+        """
+        self.file.write(json.dumps({'image': image, 'annotations': annotations}, ensure_ascii=False) + '\n')
+        self.done.add(image['path'])
+        self.next_image_id = max(self.next_image_id, image['id'] + 1)
+        if annotations:
+            self.next_annotation_id = max(self.next_annotation_id, annotations[-1]['id'] + 1)
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.file.flush()
+            self.pending = 0
+
+    def _write_array(self, out, key):
+        """
+        Streams the records of one kind from the progress file into a json array.
+
+        Parameters:
+        - out (file): The COCO json file being written.
+        - key (str): 'images' or 'annotations'.
+        """
+        out.write(f'"{key}": [')
+        first = True
+        with open(self.part_path, encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                items = [record['image']] if key == 'images' else record['annotations']
+                for item in items:
+                    out.write(('\n' if first else ',\n') + json.dumps(item, ensure_ascii=False))
+                    first = False
+        out.write('\n]')
+
+    def close(self):
+        """
+        Writes the COCO json file from the progress file and removes the progress file.
+        """
+        self.file.close()
+        tmp_path = self.output_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            out.write('{\n')
+            self._write_array(out, 'images')
+            out.write(',\n"categories": ' + json.dumps(COCO_CATEGORIES, ensure_ascii=False) + ',\n')
+            self._write_array(out, 'annotations')
+            out.write('\n}\n')
+        os.replace(tmp_path, self.output_path)
+        os.remove(self.part_path)
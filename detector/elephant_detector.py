@@ -4,25 +4,55 @@ import matplotlib.pyplot as plt
 import torch
 import os
 import tqdm
-import json
 import shutil
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from ultralytics.data.utils import IMG_FORMATS
+from ultralytics.engine.results import Results
+from detector.frame_filter import FrameFilter, DUPLICATE, camera_of, source_name
+from detector.tiling import tile_grid, merge_tile_boxes
+from detector.coco_writer import CocoWriter
+from detector.yolo_writer import YoloWriter
+
+EXPORT_FORMATS = ['onnx', 'openvino']
 
 class ElephantDetector:
     """A class for detecting elephants in images using a YOLO model."""
 
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, tiling=None, rois=None):
         """
         Initializes the ElephantDetector.
 
         Parameters:
         - model_path (str, optional): Path to the YOLO model weights file. If None, defaults to 'yolov8l.pt'.
+          Models exported by `export` (.onnx file or OpenVINO directory) are run by their runtime.
+        - tiling (dict, optional): Camera number -> (tile size, overlap) of cameras whose frames are detected
+          tile by tile, e.g. `CAMERA_TILES`. Frames of other cameras are detected whole.
+        - rois (dict, optional): Camera number -> RegionOfInterest, e.g. `CAMERA_ROIS`. Frames of these cameras
+          are cropped to the region before detection and detections outside of it are dropped.
         """
+        self.tiling = tiling or {}
+        self.rois = rois or {}
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         print(f'device = {self.device}')
         if model_path is None:
-            self.model = YOLO('yolov8l.pt').to(self.device)
+            model_path = 'yolov8l.pt'
+        self.exported = self.is_exported(model_path)
+        if self.exported:
+            self.model = YOLO(model_path, task='detect')
         else:
             self.model = YOLO(model_path).to(self.device)
+
+    @staticmethod
+    def is_exported(model_path):
+        """
+        Checks whether a model path points to an exported model instead of PyTorch weights or a model config.
+
+        Parameters:
+        - model_path (str): Path to the model.
+        """
+        return os.path.splitext(str(model_path).rstrip('/'))[1] not in ['.pt', '.yaml', '.yml']
             
     def predict_img(self, image_path, conf=0.5):
         """
@@ -48,6 +78,211 @@ class ElephantDetector:
             raise Exception('Path not found or is not a directory')
         return self.model(source=dir_path, conf=conf, stream=True)
 
+    @staticmethod
+    def list_images(dir_path):
+        """
+        Lists image files in a directory in sorted order.
+
+        Parameters:
+        - dir_path (str): Path to the directory containing images.
+        """
+        if not os.path.isdir(dir_path):
+            raise Exception('Path not found or is not a directory')
+        return [os.path.join(dir_path, filename) for filename in sorted(os.listdir(dir_path))
+                if os.path.splitext(filename)[1][1:].lower() in IMG_FORMATS]
+
+    @staticmethod
+    def load_image(source):
+        """
+        Decodes an image given by a path, arrays are returned unchanged.
+
+        Parameters:
+        - source (str, numpy.ndarray or tuple): Path to the image file, a BGR image or a (file name, BGR image) pair.
+        """
+        if isinstance(source, tuple):
+            return source[1]
+        if isinstance(source, np.ndarray):
+            return source
+        img = cv2.imread(source)
+        if img is None:
+            raise Exception(f'Image {source} not found or not readable')
+        return img
+
+    def predict_tiled(self, img, tile_size=640, overlap=0.2, conf=0.5, iou=0.5, path='', **parameters):
+        """
+        Predicts elephants in overlapping tiles of an image at full resolution and merges the detections.
+
+        Parameters:
+        - img (numpy.ndarray): BGR image.
+        - tile_size (int, optional): Side of a square tile in pixels.
+        - overlap (float, optional): Overlap of neighbouring tiles as a fraction of the tile size.
+        - conf (float, optional): Confidence threshold for detections.
+        - iou (float, optional): IoU threshold of the cross-tile non-maximum suppression.
+        - path (str, optional): Path stored in the result.
+        - **parameters: Optional YOLO prediction parameters.
+
+        Returns:
+        - (Results): Detections in image coordinates.
+        """
+        height, width = img.shape[:2]
+        tiles = tile_grid(width, height, tile_size, overlap)
+        crops = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+        results = self.model(crops, conf=conf, iou=iou, imgsz=tile_size, stream=False, verbose=False, device=self.device, **parameters)
+        boxes = merge_tile_boxes([result.boxes.data.cpu() for result in results], tiles, iou)
+        return Results(img, path=path, names=self.model.names, boxes=boxes)
+
+    def crop_roi(self, img, camera):
+        """
+        Crops a frame to the bounding box of the region of interest of its camera.
+
+        Parameters:
+        - img (numpy.ndarray): BGR image.
+        - camera (int): Camera number, frames of cameras without a region are returned whole.
+
+        Returns:
+        - (numpy.ndarray): The cropped frame, a view of `img`.
+        - (tuple): Offset (x, y) of the crop in the frame.
+        """
+        if camera not in self.rois:
+            return img, (0, 0)
+        height, width = img.shape[:2]
+        x0, y0, x1, y1 = self.rois[camera].bbox(width, height)
+        return img[y0:y1, x0:x1], (x0, y0)
+
+    def uncrop_roi(self, result, img, offset, camera):
+        """
+        Moves detections on a cropped frame back to full-frame coordinates and drops those outside the region of interest.
+
+        Parameters:
+        - result (Results): Detections on the crop returned by `crop_roi`.
+        - img (numpy.ndarray): The full frame.
+        - offset (tuple): Offset (x, y) of the crop.
+        - camera (int): Camera number.
+
+        Returns:
+        - (Results): Detections in full-frame coordinates.
+        """
+        boxes = result.boxes.data.cpu().clone()
+        boxes[:, [0, 2]] += offset[0]
+        boxes[:, [1, 3]] += offset[1]
+        height, width = img.shape[:2]
+        xyxy = boxes[:, :4].numpy()
+        xywh = np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, (xyxy[:, 1] + xyxy[:, 3]) / 2,
+                         xyxy[:, 2] - xyxy[:, 0], xyxy[:, 3] - xyxy[:, 1]], axis=1)
+        inside = self.rois[camera].contains(xywh, width, height, camera)
+        return Results(img, path=result.path, names=result.names, boxes=boxes[torch.from_numpy(inside)])
+
+    def predict_batch(self, sources, conf=0.5, batch_size=8, workers=4, frame_filter=None, report=True, **parameters):
+        """
+        Predicts elephants in a stream of images, yielding one result per image in the input order.
+
+        Images are decoded on a thread pool, the next batch is decoded while the model runs on the current one.
+        Frames of cameras in `self.rois` are cropped to their region of interest and frames of cameras
+        in `self.tiling` are detected by `predict_tiled`.
+        Throughput of the run is stored in `self.throughput` and printed at the end.
+
+        Parameters:
+        - sources (iterable): Paths to image files, BGR images as numpy arrays or (file name, BGR image) pairs
+          of frames held in memory, whose name gives the camera and the result path.
+        - conf (float, optional): Confidence threshold for detections.
+        - batch_size (int, optional): Number of images passed to the model at once.
+        - workers (int, optional): Number of decoding threads.
+        - frame_filter (FrameFilter, optional): Pre-filter run before the model. Blank frames get no detections
+          and duplicate frames reuse the detections of the last inferred frame of their camera.
+        - report (bool, optional): Print the throughput at the end.
+        - **parameters: Optional YOLO prediction parameters.
+        """
+        self.throughput = {'images': 0, 'skipped': 0, 'seconds': 0.0, 'images_per_sec': 0.0}
+        start = time.perf_counter()
+
+        def infer_frames(imgs, infer, cameras):
+            frames, offsets = {}, {}
+            for i in infer:
+                frames[i], offsets[i] = self.crop_roi(imgs[i], cameras[i])
+            tiled = [i for i in infer if cameras[i] in self.tiling]
+            whole = [i for i in infer if cameras[i] not in self.tiling]
+            inferred = {}
+            if whole:
+                results = self.model([frames[i] for i in whole], conf=conf, stream=False, verbose=False, device=self.device, **parameters)
+                inferred = dict(zip(whole, results))
+            for i in tiled:
+                tile_size, overlap = self.tiling[cameras[i]]
+                inferred[i] = self.predict_tiled(frames[i], tile_size, overlap, conf=conf, **parameters)
+            for i in infer:
+                if cameras[i] in self.rois:
+                    inferred[i] = self.uncrop_roi(inferred[i], imgs[i], offsets[i], cameras[i])
+            return inferred
+
+        def run(batch, futures):
+            imgs = [future.result() for future in futures]
+            decisions = [None] * len(batch)
+            if frame_filter is not None:
+                decisions = [frame_filter.check(source, img) for source, img in zip(batch, imgs)]
+                # A duplicate needs detections of its camera, from an earlier batch or earlier in this one
+                known = set(frame_filter.results)
+                for i, (source, decision) in enumerate(zip(batch, decisions)):
+                    camera = frame_filter.camera(source)
+                    if decision == DUPLICATE and camera not in known:
+                        decisions[i] = None
+                        frame_filter.counts[DUPLICATE] -= 1
+                        frame_filter.counts['inferred'] += 1
+                    if decisions[i] is None:
+                        known.add(camera)
+            infer = [i for i, decision in enumerate(decisions) if decision is None]
+            cameras = [camera_of(source) for source in batch]
+            try:
+                inferred = infer_frames(imgs, infer, cameras)
+            except Exception:
+                # The filter already took these frames as keyframes, their detections never arrived
+                if frame_filter is not None:
+                    for i in infer:
+                        frame_filter.forget(frame_filter.camera(batch[i]))
+                raise
+            results = []
+            for i, (source, img, decision) in enumerate(zip(batch, imgs, decisions)):
+                path = source_name(source)
+                if decision is None:
+                    result = inferred[i]
+                    if path is not None:
+                        result.path = path
+                    if frame_filter is not None:
+                        frame_filter.results[frame_filter.camera(source)] = result
+                elif decision == DUPLICATE:
+                    previous = frame_filter.results[frame_filter.camera(source)]
+                    result = Results(img, path=path or previous.path, names=previous.names, boxes=previous.boxes.data)
+                else:
+                    result = Results(img, path=path or '', names=self.model.names, boxes=torch.zeros((0, 6)))
+                results.append(result)
+            self.throughput['images'] += len(batch)
+            self.throughput['skipped'] += len(batch) - len(infer)
+            self.throughput['seconds'] = time.perf_counter() - start
+            self.throughput['images_per_sec'] = self.throughput['images'] / self.throughput['seconds']
+            return results
+
+        def batches():
+            batch = []
+            for source in sources:
+                batch.append(source)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = None
+            for batch in batches():
+                futures = [executor.submit(self.load_image, item) for item in batch]
+                if pending is not None:
+                    yield from run(*pending)
+                pending = (batch, futures)
+            if pending is not None:
+                yield from run(*pending)
+        if report:
+            print(f"{self.throughput['images']} images in {self.throughput['seconds']:.1f} s, "
+                  f"{self.throughput['images_per_sec']:.1f} images/sec on {self.device}, "
+                  f"{self.throughput['skipped']} skipped by the frame filter")
+
     @staticmethod
     def get_image_metadata(result, cnt, dataset_id=1):
         """
@@ -67,17 +302,21 @@ class ElephantDetector:
         image_metadata['file_name'] = os.path.basename(result.path)
         return image_metadata
 
-    def add_coco(self, coco_output, image_metadata, result, annotation_id):
+    @staticmethod
+    def coco_records(image_metadata, result, annotation_id):
         """
-        Adds COCO-format annotations for detected elephants to the output.
+        Builds the COCO image record and the annotations of detected elephants for one image.
 
         Parameters:
-        - coco_output (dict): The COCO output dictionary to append annotations to.
         - image_metadata (dict): Metadata for the image being annotated.
         - result: Detection result object for the image.
-        - annotation_id (int): Unique identifier for the annotation.
+        - annotation_id (int): Identifier of the first annotation.
+
+        Returns:
+        - (dict): The image record.
+        - (list): The annotation records.
         """
-        coco_output["images"].append({
+        image = {
             "id": image_metadata["id"],
             "dataset_id": image_metadata["dataset_id"],
             "category_ids": [],
@@ -93,15 +332,15 @@ class ElephantDetector:
             "milliseconds": 0,
             "events": [],
             "regenerate_thumbnail": False
-        })
-        for x in result.boxes:
-            xmin, ymin, xmax, ymax = x.cpu().numpy().xyxy[0]
-            xmin, ymin, xmax, ymax = xmin.item(), ymin.item(), xmax.item(), ymax.item()
+        }
+        annotations = []
+        # One device transfer per image, tolist gives Python floats so rounding matches per-box .item()
+        for xmin, ymin, xmax, ymax in result.boxes.xyxy.cpu().numpy().tolist():
             ymin, xmin, ymax, xmax = round(ymin, 1), round(xmin, 1), round(ymax, 1), round(xmax, 1)
             x, y, w, h = xmin, ymin, (xmax - xmin), (ymax - ymin)
             x, y, w, h = round(x, 1), round(y, 1), round(w, 1), round(h, 1)
             segmentation_points = [xmin, ymin, xmax, ymin, xmax, ymax, xmin, ymax]
-            coco_output["annotations"].append({
+            annotations.append({
                 "id": annotation_id,
                 "image_id": image_metadata["id"],
                 "category_id": 1,
@@ -114,65 +353,82 @@ class ElephantDetector:
                 "metadata": {}
             })
             annotation_id += 1
-        return annotation_id
+        return image, annotations
+
+    def add_coco(self, coco_output, image_metadata, result, annotation_id):
+        """
+        Adds COCO-format annotations for detected elephants to the output.
+
+        Parameters:
+        - coco_output (dict): The COCO output dictionary to append annotations to.
+        - image_metadata (dict): Metadata for the image being annotated.
+        - result: Detection result object for the image.
+        - annotation_id (int): Unique identifier for the annotation.
+        """
+        image, annotations = self.coco_records(image_metadata, result, annotation_id)
+        coco_output["images"].append(image)
+        coco_output["annotations"].extend(annotations)
+        return annotation_id + len(annotations)
 
-    def remove_empty(self, dir_path, split_path='SLONI_empty'):
+    def remove_empty(self, dir_path, split_path='SLONI_empty', frame_filter=None):
         """
         Moves images with no detected elephants to a separate directory.
 
         Parameters:
         - dir_path (str): Path to the directory containing images.
         - split_path (str, optional): Path to the directory where images with no detections will be moved.
+        - frame_filter (FrameFilter, optional): Pre-filter skipping the model on blank frames.
+          Defaults to `FrameFilter()`, pass False to run the model on every image.
         """
+        if frame_filter is None:
+            frame_filter = FrameFilter()
         os.makedirs(split_path, exist_ok=True)
-        for filename in tqdm.tqdm(os.listdir(dir_path)):
-            file_path = os.path.join(dir_path, filename)
-            results = self.predict_img(file_path, conf=0.4)
-            if len(results.boxes) == 0:
-                shutil.move(file_path, os.path.join(split_path, filename))
+        paths = self.list_images(dir_path)
+        for result in tqdm.tqdm(self.predict_batch(paths, conf=0.4, frame_filter=frame_filter or None), total=len(paths)):
+            if len(result.boxes) == 0:
+                shutil.move(result.path, os.path.join(split_path, os.path.basename(result.path)))
             
         
-    def yolo_annotate(self, dir_path, output_path='output_labels'):
+    def yolo_annotate(self, dir_path, output_path='output_labels', incremental=False, save_images=False, batch_size=8):
         """
         Saves YOLO format annotations for detected elephants in images.
 
+        Labels are written to output_path/labels, existing files of other images are kept.
+
         Parameters:
         - dir_path (str): Path to the directory containing images to annotate.
         - output_path (str, optional): Path to save the annotations.
+        - incremental (bool, optional): Only annotate images without a label at least as new as the image.
+        - save_images (bool, optional): Also save images with plotted detections to output_path/images.
+        - batch_size (int, optional): Number of images passed to the model at once.
         """
+        writer = YoloWriter(os.path.join(output_path, 'labels'),
+                            os.path.join(output_path, 'images') if save_images else None)
+        paths = self.list_images(dir_path)
+        if incremental:
+            paths = writer.pending(paths)
+        for result in self.predict_batch(paths, conf=0.5, batch_size=batch_size):
+            writer.write(result)
 
-        tmp_dir = 'tmp_outs'
-        if os.path.exists(tmp_dir):
-            shutil.rmtree(tmp_dir)
-        if os.path.exists(output_path):
-            shutil.rmtree(output_path)
-        self.model(dir_path, conf=0.5, save_txt=True, project=tmp_dir, device=self.device)
-        shutil.move(os.path.join(tmp_dir, 'predict'), output_path)
-        shutil.rmtree(tmp_dir)
-
-    def coco_annotate(self, dir_path, output_path='labels.json'):
+    def coco_annotate(self, dir_path, output_path='labels.json', resume=False, batch_size=8):
         """
         Saves COCO format annotations for detected elephants in images.
 
+        Annotations are streamed to disk as results arrive, so memory does not grow with the number of images.
+
         Parameters:
         - dir_path (str): Path to the directory containing images to annotate.
         - output_path (str, optional): Path to save the annotations in COCO format.
+        - resume (bool, optional): Continue an interrupted run, skipping images that were already annotated.
+        - batch_size (int, optional): Number of images passed to the model at once.
         """
-        results = self.predict_dir(dir_path)
-        coco_output = {
-            "images": [],
-            "categories": [
-                {"id": 1, "name": "Elephant", "supercategory": "", "color": "#3ab7dd", "metadata": {}, "keypoint_colors": []}
-            ],
-            "annotations": []
-        }
-        annotation_id = 1
-        for i, result in enumerate(results, 1):
-            image_metadata = self.get_image_metadata(result, i)
-            annotation_id = self.add_coco(coco_output, image_metadata, result, annotation_id)
-        print(coco_output)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(coco_output, f, ensure_ascii=False, indent=4)
+        writer = CocoWriter(output_path, resume=resume, flush_every=batch_size)
+        paths = [path for path in self.list_images(dir_path) if not writer.is_done(os.path.join('datasets', path))]
+        for result in self.predict_batch(paths, batch_size=batch_size):
+            image_metadata = self.get_image_metadata(result, writer.next_image_id)
+            image, annotations = self.coco_records(image_metadata, result, writer.next_annotation_id)
+            writer.write(image, annotations)
+        writer.close()
     
         
     def show(self, img):
@@ -201,31 +457,22 @@ class ElephantDetector:
             labeled_img = result[0].plot()
         self.show(labeled_img)
     
-    def save_labeled(self, dir_path, output_path):
+    def save_labeled(self, dir_path, output_path, incremental=False, batch_size=8):
         """
         Saves images with labels to given path
 
         Parameters:
         - dir_path (str): Path to images.
-        - dir_path (str): Where to images should be stored.
+        - output_path (str): Where to images should be stored.
+        - incremental (bool, optional): Only plot images without an output at least as new as the image.
+        - batch_size (int, optional): Number of images passed to the model at once.
         """
-        if os.path.exists(output_path):
-            shutil.rmtree(output_path)
-            
-        self.model(dir_path, save=True, project=output_path)
-        
-        
-        source_dir = os.path.join(output_path, 'predict')
-        for filename in os.listdir(source_dir):
-            source_file = os.path.join(source_dir, filename)
-            target_file = os.path.join(output_path, filename)
-
-            if os.path.isfile(source_file):
-                shutil.move(source_file, target_file)
-                # print(f"Moved: {source_file} to {target_file}")
-
-        if os.path.exists(source_dir):
-            shutil.rmtree(source_dir)
+        writer = YoloWriter(images_dir=output_path)
+        paths = self.list_images(dir_path)
+        if incremental:
+            paths = writer.pending(paths)
+        for result in self.predict_batch(paths, conf=0.25, batch_size=batch_size):
+            writer.write(result)
         
     def train(self, data='config.yaml', epochs=300, project='train_run', **parameters):
         """
@@ -237,6 +484,70 @@ class ElephantDetector:
         - project (str): Name of project
         - **parameters (str): Optional YOLO parameters.
         """
+        if self.exported:
+            raise Exception('Exported models cannot be trained')
         results = self.model.train(data=data, epochs=epochs, cache=False, device=self.device, verbose=False, project=project, **parameters)
         return results
-        
\ No newline at end of file
+        
+
+    def export(self, format='onnx', int8=False, data='config.yaml', imgsz=640, **parameters):
+        """
+        Exports the model for CPU inference with ONNX Runtime or OpenVINO.
+
+        Parameters:
+        - format (str, optional): 'onnx' or 'openvino'.
+        - int8 (bool, optional): Quantize the weights to INT8. OpenVINO calibrates on `data`,
+          ONNX models are quantized dynamically with ONNX Runtime.
+        - data (str, optional): Path to config file with calibration images.
+        - imgsz (int, optional): Input image size of the exported model.
+        - **parameters: Optional YOLO export parameters.
+
+        Returns:
+        - (str): Path to the exported model, loadable by `ElephantDetector`.
+        """
+        if self.exported:
+            raise Exception('Model is already exported')
+        if format not in EXPORT_FORMATS:
+            raise Exception(f'Unsupported format {format}, use one of {EXPORT_FORMATS}')
+        if format == 'onnx':
+            path = self.model.export(format='onnx', imgsz=imgsz, device='cpu', **parameters)
+            if int8:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                int8_path = os.path.splitext(path)[0] + '_int8.onnx'
+                quantize_dynamic(path, int8_path, weight_type=QuantType.QUInt8)
+                path = int8_path
+        else:
+            path = self.model.export(format='openvino', int8=int8, data=data if int8 else None, imgsz=imgsz, device='cpu', **parameters)
+        return str(path)
+
+
+def compare_backends(model_paths, data='config.yaml', split='val', conf=0.5, imgsz=640):
+    """
+    Validates models on a dataset split on CPU and reports their accuracy and latency.
+
+    Parameters:
+    - model_paths (list): Paths to PyTorch weights or exported models.
+    - data (str, optional): Path to config file.
+    - split (str, optional): Dataset split to validate on.
+    - conf (float, optional): Confidence threshold for detections.
+    - imgsz (int, optional): Input image size.
+
+    Returns:
+    - (list): One dict per model with precision, recall, mAP50, mAP50-95 and inference time per image in ms.
+    """
+    rows = []
+    for model_path in model_paths:
+        model = YOLO(model_path, task='detect')
+        metrics = model.val(data=data, split=split, conf=conf, imgsz=imgsz, batch=1, device='cpu', plots=False, verbose=False)
+        rows.append({
+            'model': model_path,
+            'precision': metrics.box.mp,
+            'recall': metrics.box.mr,
+            'mAP50': metrics.box.map50,
+            'mAP50-95': metrics.box.map,
+            'inference_ms': metrics.speed['inference']
+        })
+    print(f"{'model':<50} {'P':>6} {'R':>6} {'mAP50':>6} {'ms/img':>8}")
+    for row in rows:
+        print(f"{row['model']:<50} {row['precision']:6.3f} {row['recall']:6.3f} {row['mAP50']:6.3f} {row['inference_ms']:8.1f}")
+    return rows
@@ -0,0 +1,170 @@
+import os
+import re
+import cv2
+import numpy as np
+
+CAMERA_PATTERN = re.compile(r'screenshot(\d+)_')
+BLANK = 'blank'
+DUPLICATE = 'duplicate'
+
+
+def blank_ratio(img):
+    """
+    Computes the share of black pixels in an image, as `split_files` does.
+
+    Parameters:
+    - img (numpy.ndarray): BGR image.
+
+    Returns:
+    - (float): Ratio of pixels with all channels equal to zero.
+    """
+    if img.ndim == 2:
+        return np.count_nonzero(img == 0) / img.size
+    return np.count_nonzero(~img.any(axis=-1)) / (img.shape[0] * img.shape[1])
+
+
+def thumbnail(img, size=(32, 32)):
+    """
+    Downsamples an image to a small grayscale thumbnail.
+
+    Parameters:
+    - img (numpy.ndarray): BGR image.
+    - size (tuple, optional): Thumbnail (width, height).
+
+    Returns:
+    - (numpy.ndarray): Grayscale thumbnail as float32.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def dhash(img, hash_size=8):
+    """
+    Computes the difference hash of an image, similar frames have hashes with a small Hamming distance.
+
+    Parameters:
+    - img (numpy.ndarray): BGR image.
+    - hash_size (int, optional): The hash has hash_size * hash_size bits.
+
+    Returns:
+    - (numpy.ndarray): Boolean array of the hash bits.
+    """
+    small = thumbnail(img, (hash_size + 1, hash_size))
+    return (small[:, 1:] > small[:, :-1]).ravel()
+
+
+def motion_score(thumb1, thumb2):
+    """
+    Measures the change between two thumbnails as the mean absolute difference of their pixels.
+
+    Parameters:
+    - thumb1 (numpy.ndarray): Thumbnail returned by `thumbnail`.
+    - thumb2 (numpy.ndarray): Thumbnail of the same size.
+
+    Returns:
+    - (float): Mean absolute difference in gray levels (0-255).
+    """
+    return float(np.abs(thumb1 - thumb2).mean())
+
+
+def source_name(source):
+    """
+    Returns the path or file name of an image source, None for bare arrays.
+
+    Parameters:
+    - source (str, numpy.ndarray or tuple): Path to the image, the image itself or a (file name, image) pair.
+    """
+    if isinstance(source, tuple):
+        return source[0]
+    return source if isinstance(source, str) else None
+
+
+def camera_of(source):
+    """
+    Returns the camera number of a screenshot path, images without a camera in their name return None.
+
+    Parameters:
+    - source (str, numpy.ndarray or tuple): Path to the image, the image itself or a (file name, image) pair.
+    """
+    name = source_name(source)
+    if name is None:
+        return None
+    match = CAMERA_PATTERN.match(os.path.basename(name))
+    return int(match.group(1)) if match else None
+
+
+class FrameFilter:
+    """A cheap test run before the detector, it finds blank frames and, if enabled, frames unchanged since the last inferred frame of the same camera."""
+
+    def __init__(self, blank_threshold=0.6, hash_distance=None, motion_threshold=None, camera=camera_of):
+        """
+        Initializes the FrameFilter.
+
+        Parameters:
+        - blank_threshold (float, optional): Frames with a larger share of black pixels are blank. None disables the test.
+        - hash_distance (int, optional): Frames whose dhash differs from the last inferred frame of their camera
+          in at most this many bits are duplicates. None, the default, disables the test: an elephant entering
+          the frame changes only a few bits of the 8x8 hash, so enable it only together with `motion_threshold`
+          calibrated on real captures.
+        - motion_threshold (float, optional): If set, a frame is only a duplicate when its motion score against
+          the last inferred frame is also below this value.
+        - camera (callable, optional): Maps a source to its camera, sources mapped to None are never duplicates.
+        """
+        self.blank_threshold = blank_threshold
+        self.hash_distance = hash_distance
+        self.motion_threshold = motion_threshold
+        self.camera = camera
+        # camera -> (hash, thumbnail) of the last frame the detector ran on
+        self.keyframes = {}
+        # camera -> detections on its last inferred frame, kept by the detector across calls
+        self.results = {}
+        self.counts = {BLANK: 0, DUPLICATE: 0, 'inferred': 0}
+
+    def check(self, source, img):
+        """
+        Decides whether the detector has to run on a frame. Frames have to be checked in capture order.
+
+        Parameters:
+        - source (str or numpy.ndarray): Path to the image or the image itself.
+        - img (numpy.ndarray): The decoded BGR image.
+
+        Returns:
+        - (str): `BLANK` for blank frames, `DUPLICATE` for frames whose previous detections can be reused,
+          None when the detector has to run.
+        """
+        if self.blank_threshold is not None and blank_ratio(img) >= self.blank_threshold:
+            self.counts[BLANK] += 1
+            return BLANK
+        camera = self.camera(source)
+        if self.hash_distance is None or camera is None:
+            self.counts['inferred'] += 1
+            return None
+
+        frame_hash = dhash(img)
+        thumb = thumbnail(img) if self.motion_threshold is not None else None
+        keyframe = self.keyframes.get(camera)
+        if keyframe is not None and np.count_nonzero(frame_hash != keyframe[0]) <= self.hash_distance:
+            if self.motion_threshold is None or motion_score(thumb, keyframe[1]) < self.motion_threshold:
+                self.counts[DUPLICATE] += 1
+                return DUPLICATE
+        self.keyframes[camera] = (frame_hash, thumb)
+        self.counts['inferred'] += 1
+        return None
+
+    def forget(self, camera):
+        """
+        Forgets the last inferred frame of a camera, e.g. when the detector failed on it.
+
+        Parameters:
+        - camera (int): Camera number.
+        """
+        self.keyframes.pop(camera, None)
+        self.results.pop(camera, None)
+
+    def reset(self):
+        """
+        Forgets the last inferred frames and the counts.
+        """
+        self.keyframes = {}
+        self.results = {}
+        self.counts = {BLANK: 0, DUPLICATE: 0, 'inferred': 0}
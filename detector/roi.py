@@ -0,0 +1,82 @@
+import numpy as np
+import cv2
+from visualize.image_points import IMG_WIDTH, IMG_HEIGHT, shift
+
+
+class RegionOfInterest:
+    """The part of a camera view where elephants can be, given as a polygon in screenshot coordinates."""
+
+    def __init__(self, polygon, margin=100, headroom=100):
+        """
+        Initializes the RegionOfInterest.
+
+        Parameters:
+        - polygon (numpy.ndarray): (N, 2) polygon vertices for a IMG_WIDTH x IMG_HEIGHT frame.
+        - margin (int, optional): Distance in pixels around the polygon that still belongs to the region,
+          elephants standing at its border reach above it.
+        - headroom (int, optional): Pixels above the polygon kept in the crop, the polygon outlines the floor
+          and elephants standing at its far edge reach above it.
+        """
+        self.polygon = np.asarray(polygon, dtype=np.float32)
+        self.margin = margin
+        self.headroom = headroom
+
+    def scaled(self, width, height):
+        """
+        Returns the polygon, margin and headroom for a frame of a different size than the screenshots.
+
+        Parameters:
+        - width (int): Frame width.
+        - height (int): Frame height.
+        """
+        scale = np.array([width / IMG_WIDTH, height / IMG_HEIGHT], dtype=np.float32)
+        return self.polygon * scale, self.margin * max(scale), self.headroom * scale[1]
+
+    def bbox(self, width, height):
+        """
+        Returns the bounding box of the region with its margin and headroom, clipped to the frame.
+
+        Parameters:
+        - width (int): Frame width.
+        - height (int): Frame height.
+
+        Returns:
+        - (tuple): x0, y0, x1, y1 in pixels.
+        """
+        polygon, margin, headroom = self.scaled(width, height)
+        x0, y0 = np.floor(polygon.min(axis=0) - [margin, max(margin, headroom)]).astype(int)
+        x1, y1 = np.ceil(polygon.max(axis=0) + margin).astype(int)
+        return max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+
+    def contains(self, boxes, width, height, camera=None):
+        """
+        Tests which detections stand inside the region, using the same ground point as the map projection.
+
+        Parameters:
+        - boxes (numpy.ndarray): (N, 4) boxes as x_center, y_center, width, height in pixels.
+        - width (int): Frame width.
+        - height (int): Frame height.
+        - camera (int, optional): Camera number passed to `shift`.
+
+        Returns:
+        - (numpy.ndarray): Boolean mask of the boxes inside the region.
+        """
+        polygon, margin, _ = self.scaled(width, height)
+        x, y, _, _ = shift(boxes[:, 0], boxes[:, 1].copy(), boxes[:, 2], boxes[:, 3], camera)
+        contour = polygon.reshape(-1, 1, 2)
+        distances = [cv2.pointPolygonTest(contour, (float(px), float(py)), True) for px, py in zip(x, y)]
+        return np.array(distances, dtype=np.float32).reshape(-1) >= -margin
+
+
+# Floor of the enclosure outlined by hand on visualize/backgrounds, every detection in visualize/positions.csv
+# stands inside its region and fits into its crop
+CAMERA_ROIS = {
+    1: RegionOfInterest([(0, 1000), (0, 560), (300, 200), (520, 130), (900, 100), (1370, 100), (1560, 330),
+                         (1920, 800), (1920, 1000)]),
+    2: RegionOfInterest([(0, 1000), (0, 420), (300, 380), (780, 240), (1050, 280), (1920, 600), (1920, 1000)], headroom=250),
+    4: RegionOfInterest([(0, 150), (400, 20), (1920, 20), (1920, 650), (1400, 800), (800, 850), (300, 700), (0, 600)]),
+    6: RegionOfInterest([(0, 400), (400, 350), (650, 280), (1100, 270), (1500, 290), (1920, 380), (1920, 780),
+                         (1350, 740), (1250, 620), (750, 560), (300, 560), (0, 560)]),
+    7: RegionOfInterest([(60, 1000), (60, 930), (560, 180), (660, 90), (1000, 90), (1100, 200), (1650, 330),
+                         (1800, 380), (1920, 650), (1920, 1000)])
+}
@@ -0,0 +1,275 @@
+"""
+Local HTTP inference server sharing one loaded ElephantDetector between processes.
+
+Run from the repository root:
+    python -m detector.server --weights runs/best_run/train/weights/best.pt --port 8500
+
+Endpoints:
+    POST /predict   image bytes as the body, or json {"path": "..."} of an image on this machine
+    GET  /health    model and device
+    GET  /metrics   request, batch and latency counters
+"""
+
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+import numpy as np
+import cv2
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from detector.elephant_detector import ElephantDetector
+
+
+class MicroBatcher:
+    """Merges concurrent detection requests into batches run by a single thread."""
+
+    def __init__(self, detector, batch_size=8, max_wait=0.01, conf=0.5):
+        """
+        Initializes the MicroBatcher.
+
+        Parameters:
+        - detector (ElephantDetector): The detector shared by all requests.
+        - batch_size (int, optional): Maximal number of images in a batch.
+        - max_wait (float, optional): Seconds the first request of a batch waits for others to join.
+        - conf (float, optional): Confidence threshold for detections.
+        """
+        self.detector = detector
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.conf = conf
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'images': 0, 'batches': 0, 'errors': 0,
+                         'latency_sum': 0.0, 'latency_max': 0.0, 'busy_seconds': 0.0}
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, source):
+        """
+        Queues an image for detection.
+
+        Parameters:
+        - source (str or numpy.ndarray): Path to the image file or a BGR image.
+
+        Returns:
+        - (Future): Resolves to the detection result.
+        """
+        future = Future()
+        self.requests.put((source, future, time.perf_counter()))
+        return future
+
+    def loop(self):
+        """
+        Collects requests into batches and runs them until the process exits.
+        """
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.run(batch)
+
+    def run(self, batch):
+        """
+        Detects elephants on a batch and resolves the futures of its requests.
+
+        Parameters:
+        - batch (list): Tuples of source, future and submission time.
+        """
+        start = time.perf_counter()
+        sources = [source for source, _, _ in batch]
+        try:
+            results = list(self.detector.predict_batch(sources, conf=self.conf, batch_size=len(sources), report=False))
+        except Exception:
+            # Resolve each request on its own, so one unreadable image does not fail the others
+            results = []
+            for source in sources:
+                try:
+                    results.extend(self.detector.predict_batch([source], conf=self.conf, batch_size=1, report=False))
+                except Exception as e:
+                    results.append(e)
+        done = time.perf_counter()
+        with self.lock:
+            self.counters['batches'] += 1
+            self.counters['busy_seconds'] += done - start
+            for (_, future, submitted), result in zip(batch, results):
+                self.counters['requests'] += 1
+                if isinstance(result, Exception):
+                    self.counters['errors'] += 1
+                    future.set_exception(result)
+                    continue
+                self.counters['images'] += 1
+                latency = done - submitted
+                self.counters['latency_sum'] += latency
+                self.counters['latency_max'] = max(self.counters['latency_max'], latency)
+                future.set_result(result)
+
+    def metrics(self):
+        """
+        Returns the counters of the batcher.
+
+        Returns:
+        - (dict): Requests, images, batches, errors, queue depth, mean batch size, mean and maximal latency in ms
+          and throughput while busy.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+        images, batches = counters['images'], counters['batches']
+        return {
+            'requests': counters['requests'],
+            'images': images,
+            'batches': batches,
+            'errors': counters['errors'],
+            'queue_depth': self.requests.qsize(),
+            'batch_size_mean': images / batches if batches else 0.0,
+            'latency_ms_mean': 1000 * counters['latency_sum'] / images if images else 0.0,
+            'latency_ms_max': 1000 * counters['latency_max'],
+            'images_per_sec': images / counters['busy_seconds'] if counters['busy_seconds'] else 0.0
+        }
+
+
+def result_json(result):
+    """
+    Converts a detection result into a json serializable dict.
+
+    Parameters:
+    - result: Detection result object for the image.
+
+    Returns:
+    - (dict): Image size and boxes with pixel xyxy coordinates, normalized xywh, confidence and class.
+    """
+    boxes = result.boxes
+    height, width = result.orig_shape
+    return {
+        'width': width,
+        'height': height,
+        'boxes': [{'xyxy': xyxy, 'xywhn': xywhn, 'conf': conf, 'class': int(cls)}
+                  for xyxy, xywhn, conf, cls in zip(boxes.xyxy.cpu().numpy().tolist(), boxes.xywhn.cpu().numpy().tolist(),
+                                                    boxes.conf.cpu().numpy().tolist(), boxes.cls.cpu().numpy().tolist())]
+    }
+
+
+class DetectionHandler(BaseHTTPRequestHandler):
+    """Request handler of the inference server, `server.batcher` runs the detections."""
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            detector = self.server.batcher.detector
+            self.send_json(200, {'status': 'ok', 'device': detector.device, 'exported': detector.exported,
+                                 'classes': detector.model.names})
+        elif self.path == '/metrics':
+            self.send_json(200, self.server.batcher.metrics())
+        else:
+            self.send_json(404, {'error': f'Unknown endpoint {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.send_json(404, {'error': f'Unknown endpoint {self.path}'})
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                source = json.loads(body)['path']
+            except (ValueError, KeyError, TypeError):
+                self.send_json(400, {'error': 'Body has to be json {"path": "..."}'})
+                return
+            if not isinstance(source, str):
+                self.send_json(400, {'error': 'Path has to be a string'})
+                return
+        else:
+            source = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if source is None:
+                self.send_json(400, {'error': 'Body is not a readable image'})
+                return
+        start = time.perf_counter()
+        try:
+            result = self.server.batcher.submit(source).result()
+        except Exception as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        data = result_json(result)
+        data['latency_ms'] = 1000 * (time.perf_counter() - start)
+        self.send_json(200, data)
+
+    def log_message(self, format, *args):
+        # Requests are counted in /metrics instead of logged
+        pass
+
+
+def serve(detector, host='127.0.0.1', port=8500, batch_size=8, max_wait=0.01, conf=0.5):
+    """
+    Creates the inference server, call `serve_forever` on it to start serving.
+
+    Parameters:
+    - detector (ElephantDetector): The detector shared by all requests.
+    - host (str, optional): Address to bind, local only by default.
+    - port (int, optional): Port to bind, 0 picks a free one.
+    - batch_size (int, optional): Maximal number of images in a batch.
+    - max_wait (float, optional): Seconds a request waits for others to join its batch.
+    - conf (float, optional): Confidence threshold for detections.
+
+    Returns:
+    - (ThreadingHTTPServer): The server.
+    """
+    server = ThreadingHTTPServer((host, port), DetectionHandler)
+    server.batcher = MicroBatcher(detector, batch_size=batch_size, max_wait=max_wait, conf=conf)
+    return server
+
+
+def request_detection(url, image=None, path=None, timeout=60):
+    """
+    Sends an image to a running inference server.
+
+    Parameters:
+    - url (str): Server address, e.g. 'http://127.0.0.1:8500'.
+    - image (bytes or numpy.ndarray, optional): Encoded image file or a BGR image.
+    - path (str, optional): Path of an image readable by the server, used when no image is given.
+    - timeout (float, optional): Timeout of the request in seconds.
+
+    Returns:
+    - (dict): Detections as returned by the server.
+    """
+    if image is not None:
+        if isinstance(image, np.ndarray):
+            image = cv2.imencode('.png', image)[1].tobytes()
+        request = urllib.request.Request(url + '/predict', data=image, headers={'Content-Type': 'application/octet-stream'})
+    else:
+        request = urllib.request.Request(url + '/predict', data=json.dumps({'path': path}).encode(),
+                                         headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve elephant detection over local HTTP.')
+    parser.add_argument("--weights", default=None, help="Model weights, defaults to yolov8l.pt.")
+    parser.add_argument("--host", default='127.0.0.1', help="Address to bind.")
+    parser.add_argument("--port", type=int, default=8500, help="Port to bind.")
+    parser.add_argument("--batch-size", type=int, default=8, help="Maximal batch size.")
+    parser.add_argument("--max-wait", type=float, default=0.01, help="Seconds a request waits for a batch to fill.")
+    parser.add_argument("--conf", type=float, default=0.5, help="Confidence threshold.")
+    args = parser.parse_args()
+
+    server = serve(ElephantDetector(args.weights), args.host, args.port, args.batch_size, args.max_wait, args.conf)
+    print(f'Serving on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
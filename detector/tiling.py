@@ -0,0 +1,61 @@
+import numpy as np
+import torch
+from torchvision.ops import batched_nms
+
+# camera -> (tile size in pixels, overlap as a fraction of the tile), cameras 4 and 6 cover the widest areas
+CAMERA_TILES = {
+    4: (640, 0.2),
+    6: (640, 0.2)
+}
+
+
+def tile_grid(width, height, tile_size=640, overlap=0.2):
+    """
+    Splits an image into overlapping tiles covering it completely. The last tile of a row or column is
+    shifted back to end at the image border, tiles are never larger than the image.
+
+    Parameters:
+    - width (int): Image width.
+    - height (int): Image height.
+    - tile_size (int, optional): Side of a square tile in pixels.
+    - overlap (float, optional): Minimal overlap of neighbouring tiles as a fraction of the tile size.
+
+    Returns:
+    - (list): Tiles as (x0, y0, x1, y1).
+    """
+    def starts(length):
+        size = min(tile_size, length)
+        if size == length:
+            return [0], size
+        stride = max(1, int(size * (1 - overlap)))
+        count = int(np.ceil((length - size) / stride)) + 1
+        return [min(i * stride, length - size) for i in range(count)], size
+
+    xs, tile_w = starts(width)
+    ys, tile_h = starts(height)
+    return [(x, y, x + tile_w, y + tile_h) for y in ys for x in xs]
+
+
+def merge_tile_boxes(tile_boxes, tiles, iou=0.5):
+    """
+    Moves detections of tiles into image coordinates and removes duplicates found by overlapping tiles.
+
+    Parameters:
+    - tile_boxes (list): For each tile a (N, 6) tensor of x1, y1, x2, y2, confidence, class in tile coordinates.
+    - tiles (list): Tiles as returned by `tile_grid`.
+    - iou (float, optional): IoU threshold of the cross-tile non-maximum suppression.
+
+    Returns:
+    - (torch.Tensor): (M, 6) tensor of the merged detections in image coordinates, sorted by confidence.
+    """
+    shifted = []
+    for boxes, (x0, y0, _, _) in zip(tile_boxes, tiles):
+        boxes = boxes.clone()
+        boxes[:, [0, 2]] += x0
+        boxes[:, [1, 3]] += y0
+        shifted.append(boxes)
+    boxes = torch.cat(shifted) if shifted else torch.zeros((0, 6))
+    if len(boxes) == 0:
+        return boxes
+    keep = batched_nms(boxes[:, :4], boxes[:, 4], boxes[:, 5].long(), iou)
+    return boxes[keep]
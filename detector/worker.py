@@ -0,0 +1,202 @@
+"""
+Resident detection worker. Loads the model once and labels screenshots as the scraper stores them.
+
+Run from the repository root:
+    python -m detector.worker scraping/scraped_images --labels data_all/labels --positions worker_positions.csv
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from ultralytics.data.utils import IMG_FORMATS
+from detector.elephant_detector import ElephantDetector
+from detector.frame_filter import FrameFilter
+from detector.yolo_writer import YoloWriter, atomic_write
+from visualize.read_positions import detection_positions, append_positions
+
+
+class DetectionWorker:
+    """Watches an inbox directory by polling and detects elephants on new screenshots in batches."""
+
+    def __init__(self, detector, inbox_dir, labels_dir, positions_csv=None, batch_size=8, poll_interval=2.0,
+                 settle_time=1.0, frame_filter=None, stats_path=None, max_retries=3):
+        """
+        Initializes the DetectionWorker.
+
+        Parameters:
+        - detector (ElephantDetector): Detector with the loaded model, reused for every batch.
+        - inbox_dir (str): Directory the scraper stores screenshots to.
+        - labels_dir (str): Directory for the YOLO labels.
+        - positions_csv (str, optional): Positions file the detections of every batch are appended to by
+          `append_positions`. It has to be new or created by `read_positions(..., incremental=True)`, and the
+          labels written by the worker must not be read into it again.
+        - batch_size (int, optional): Maximal number of screenshots detected at once.
+        - poll_interval (float, optional): Seconds between scans of the inbox.
+        - settle_time (float, optional): Seconds a file has to stay unmodified before it is read,
+          the scraper crops screenshots in place after saving them.
+        - frame_filter (FrameFilter, optional): Pre-filter kept across batches, defaults to `FrameFilter()`.
+        - stats_path (str, optional): Json file the counters are written to after every batch.
+        - max_retries (int, optional): Times a screenshot of a failed batch is queued again before it is skipped.
+        """
+        self.detector = detector
+        self.inbox_dir = inbox_dir
+        self.positions_csv = positions_csv
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.frame_filter = frame_filter if frame_filter is not None else FrameFilter()
+        self.stats_path = stats_path
+        self.writer = YoloWriter(labels_dir)
+        self.seen = {}
+        self.failures = {}
+        self.max_retries = max_retries
+        self.queue = deque()
+        self.counters = {'queued': 0, 'processed': 0, 'batches': 0, 'errors': 0,
+                         'busy_seconds': 0.0, 'latency_sum': 0.0, 'latency_max': 0.0}
+        self.started = time.time()
+
+    def scan(self):
+        """
+        Queues screenshots that appeared or changed in the inbox and settled since the last scan.
+
+        Returns:
+        - (int): Number of queued screenshots.
+        """
+        now = time.time()
+        present = set()
+        queued = 0
+        if os.path.isdir(self.inbox_dir):
+            with os.scandir(self.inbox_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file() or os.path.splitext(entry.name)[1][1:].lower() not in IMG_FORMATS:
+                        continue
+                    present.add(entry.name)
+                    mtime = entry.stat().st_mtime
+                    if self.seen.get(entry.name) == mtime or now - mtime < self.settle_time:
+                        continue
+                    self.seen[entry.name] = mtime
+                    self.queue.append((entry.path, mtime))
+                    queued += 1
+        # Screenshots removed by the scraper are forgotten
+        self.seen = {name: mtime for name, mtime in self.seen.items() if name in present}
+        self.failures = {name: count for name, count in self.failures.items() if name in present}
+        self.counters['queued'] += queued
+        return queued
+
+    def process(self):
+        """
+        Detects elephants on the next batch of queued screenshots, writes their labels and updates the positions.
+
+        Returns:
+        - (int): Number of processed screenshots.
+        """
+        if not self.queue:
+            return 0
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        # Frames of a camera have to reach the frame filter in capture order
+        batch.sort(key=lambda item: item[1])
+        paths = [path for path, _ in batch]
+        start = time.perf_counter()
+        try:
+            results = list(self.detector.predict_batch(paths, batch_size=self.batch_size, frame_filter=self.frame_filter))
+            for result in results:
+                self.writer.write(result)
+            if self.positions_csv is not None:
+                df = detection_positions(paths, [result.boxes.xywhn.cpu().numpy() for result in results])
+                if len(df):
+                    append_positions(df, self.positions_csv)
+        except Exception as e:
+            print(f'Detection of {len(paths)} screenshots failed: {e}', file=sys.stderr)
+            self.counters['errors'] += 1
+            self.retry(paths)
+            return 0
+        for path in paths:
+            self.failures.pop(os.path.basename(path), None)
+        self.counters['busy_seconds'] += time.perf_counter() - start
+        done = time.time()
+        for _, mtime in batch:
+            latency = done - mtime
+            self.counters['latency_sum'] += latency
+            self.counters['latency_max'] = max(self.counters['latency_max'], latency)
+        self.counters['processed'] += len(batch)
+        self.counters['batches'] += 1
+        return len(batch)
+
+    def retry(self, paths):
+        """
+        Forgets screenshots of a failed batch, so the next scan queues them again.
+
+        Parameters:
+        - paths (list): Paths of the screenshots.
+        """
+        for path in paths:
+            name = os.path.basename(path)
+            self.failures[name] = self.failures.get(name, 0) + 1
+            if self.failures[name] <= self.max_retries:
+                self.seen.pop(name, None)
+            else:
+                print(f'Skipping {name} after {self.max_retries} retries', file=sys.stderr)
+                del self.failures[name]
+
+    def stats(self):
+        """
+        Returns the counters of the worker.
+
+        Returns:
+        - (dict): Queue depth, processed screenshots and batches, mean and maximal latency from the screenshot
+          being stored to its label being written, throughput while busy and frames skipped by the filter.
+        """
+        processed = self.counters['processed']
+        busy = self.counters['busy_seconds']
+        return {
+            'queue_depth': len(self.queue),
+            'queued': self.counters['queued'],
+            'processed': processed,
+            'batches': self.counters['batches'],
+            'errors': self.counters['errors'],
+            'latency_mean': self.counters['latency_sum'] / processed if processed else 0.0,
+            'latency_max': self.counters['latency_max'],
+            'images_per_sec': processed / busy if busy else 0.0,
+            'skipped': self.frame_filter.counts['blank'] + self.frame_filter.counts['duplicate'],
+            'uptime': time.time() - self.started
+        }
+
+    def run(self, max_batches=None):
+        """
+        Polls the inbox and processes screenshots until interrupted.
+
+        Parameters:
+        - max_batches (int, optional): Stop after this many batches, runs forever if None.
+        """
+        try:
+            while max_batches is None or self.counters['batches'] < max_batches:
+                self.scan()
+                if not self.process():
+                    time.sleep(self.poll_interval)
+                    continue
+                stats = self.stats()
+                print(f"processed {stats['processed']}, queue {stats['queue_depth']}, "
+                      f"latency {stats['latency_mean']:.1f} s, {stats['images_per_sec']:.1f} images/sec")
+                if self.stats_path is not None:
+                    atomic_write(self.stats_path, json.dumps(stats, indent=4))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Detect elephants on screenshots as they are scraped.')
+    parser.add_argument("inbox", help="Directory the scraper stores screenshots to.")
+    parser.add_argument("--labels", default='labels', help="Directory for the YOLO labels.")
+    parser.add_argument("--positions", default=None, help="Positions csv file to update.")
+    parser.add_argument("--weights", default=None, help="Model weights, defaults to yolov8l.pt.")
+    parser.add_argument("--batch-size", type=int, default=8, help="Screenshots detected at once.")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between inbox scans.")
+    parser.add_argument("--stats", default=None, help="Json file with the worker counters.")
+    args = parser.parse_args()
+
+    worker = DetectionWorker(ElephantDetector(args.weights), args.inbox, args.labels, args.positions,
+                             batch_size=args.batch_size, poll_interval=args.poll_interval, stats_path=args.stats)
+    worker.run()
@@ -0,0 +1,109 @@
+import os
+import uuid
+import cv2
+
+
+def atomic_write(path, data):
+    """
+    Writes a file through a temporary file in the same directory, readers never see a partial file.
+
+    Parameters:
+    - path (str): Path to the file.
+    - data (str or bytes): Content of the file.
+    """
+    tmp_path = os.path.join(os.path.dirname(path) or '.', f'.{uuid.uuid4().hex}.tmp')
+    mode = 'w' if isinstance(data, str) else 'wb'
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def label_text(result):
+    """
+    Formats the detections of a result as YOLO labels, like `Results.save_txt`.
+
+    Parameters:
+    - result: Detection result object for the image.
+
+    Returns:
+    - (str): One 'class x_center y_center width height' line per box with normalized coordinates.
+    """
+    boxes = result.boxes
+    classes = boxes.cls.cpu().numpy().tolist()
+    xywhn = boxes.xywhn.cpu().numpy().tolist()
+    return ''.join(('%g ' * 5).rstrip() % (int(c), *box) + '\n' for c, box in zip(classes, xywhn))
+
+
+def is_up_to_date(output_path, source_path):
+    """
+    Checks whether an output file exists and is not older than the image it was made from.
+
+    Parameters:
+    - output_path (str): Path to the label or plotted image.
+    - source_path (str): Path to the source image.
+    """
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+    except FileNotFoundError:
+        return False
+
+
+class YoloWriter:
+    """Writes YOLO labels and plotted images of detection results straight into their final directories."""
+
+    def __init__(self, labels_dir=None, images_dir=None, **plot_parameters):
+        """
+        Initializes the YoloWriter.
+
+        Parameters:
+        - labels_dir (str, optional): Directory for the .txt labels, None skips the labels.
+        - images_dir (str, optional): Directory for the plotted images, None skips the images.
+        - **plot_parameters: Optional parameters of `Results.plot`.
+        """
+        self.labels_dir = labels_dir
+        self.images_dir = images_dir
+        self.plot_parameters = plot_parameters
+        for directory in [labels_dir, images_dir]:
+            if directory is not None:
+                os.makedirs(directory, exist_ok=True)
+
+    def outputs(self, image_path):
+        """
+        Returns the paths written for an image.
+
+        Parameters:
+        - image_path (str): Path to the source image.
+        """
+        name = os.path.basename(image_path)
+        paths = []
+        if self.labels_dir is not None:
+            paths.append(os.path.join(self.labels_dir, os.path.splitext(name)[0] + '.txt'))
+        if self.images_dir is not None:
+            paths.append(os.path.join(self.images_dir, name))
+        return paths
+
+    def pending(self, image_paths):
+        """
+        Filters images whose outputs are missing or older than the image.
+
+        Parameters:
+        - image_paths (list): Paths to the source images.
+        """
+        return [path for path in image_paths
+                if not all(is_up_to_date(output, path) for output in self.outputs(path))]
+
+    def write(self, result):
+        """
+        Writes the outputs of one result. Images without detections get an empty label file.
+
+        Parameters:
+        - result: Detection result object, its `path` names the source image.
+        """
+        name = os.path.basename(result.path)
+        if self.labels_dir is not None:
+            atomic_write(os.path.join(self.labels_dir, os.path.splitext(name)[0] + '.txt'), label_text(result))
+        if self.images_dir is not None:
+            ok, data = cv2.imencode(os.path.splitext(name)[1] or '.jpg', result.plot(**self.plot_parameters))
+            if not ok:
+                raise Exception(f'Could not encode plotted image {name}')
+            atomic_write(os.path.join(self.images_dir, name), data.tobytes())
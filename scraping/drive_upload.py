@@ -2,8 +2,15 @@ from googleapiclient.http import MediaFileUpload
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import AuthorizedSession
 from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import requests
+import threading
+import hashlib
+import random
+import json
 import time
 import os
 import shutil
@@ -73,15 +80,14 @@ def upload_file(service, file_name, file_path,
     print(f'File ID: {file.get("id")}')
 
 
-def auth():
+def load_credentials():
     """
-    Authenticates the user with Google Drive API and returns the service object.
+    Loads the user's Google Drive credentials, logging in or refreshing the token when needed.
 
-    This function handles token creation and refresh for Google Drive API access.
     It uses a token.json file for storing user credentials.
 
     Returns:
-        service: An authorized Google Drive service instance.
+        Credentials: Valid credentials of the user.
     """
     creds = None
     SCOPES = ['https://www.googleapis.com/auth/drive']
@@ -102,23 +108,339 @@ def auth():
         # Save the credentials for the next run
         with open("token.json", "w") as token:
             token.write(creds.to_json())
-    service = build("drive", "v3", credentials=creds)
+    return creds
+
+
+def auth():
+    """
+    Authenticates the user with Google Drive API and returns the service object.
+
+    This function handles token creation and refresh for Google Drive API access.
+    It uses a token.json file for storing user credentials.
+
+    Returns:
+        service: An authorized Google Drive service instance.
+    """
+    service = build("drive", "v3", credentials=load_credentials())
 
     return service
 
 
-def upload_to_drive(dir, target):
+def file_md5(file_path, chunk_size=1 << 20):
+    """
+    Computes the MD5 checksum of a file, the same checksum Google Drive reports as md5Checksum.
+
+    Args:
+        file_path (str): The local path of the file.
+        chunk_size (int, optional): Bytes read at once.
+
+    Returns:
+        str: Hex digest of the file.
+    """
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class UploadLedger:
+    """Append-only record of uploaded files, one json line per file, so an interrupted run resumes where it stopped."""
+
+    def __init__(self, path):
+        """
+        Loads the ledger.
+
+        Args:
+            path (str): The ledger file, created on the first upload.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        # (folder_id, name, md5) -> Drive file ID
+        self.uploaded = {}
+        # (folder_id, name) -> (size, mtime, md5) of the last upload, saves hashing unchanged files
+        self.stats = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut off by a crash
+                        continue
+                    self.add(entry)
+
+    def add(self, entry):
+        self.uploaded[(entry['folder'], entry['name'], entry['md5'])] = entry['id']
+        self.stats[(entry['folder'], entry['name'])] = (entry['size'], entry['mtime'], entry['md5'])
+
+    def checksum(self, folder_id, name, file_path):
+        """
+        Returns the MD5 checksum of a file, reused from the ledger if its size and mtime did not change.
+
+        Args:
+            folder_id (str): The target folder ID.
+            name (str): The name of the file in the folder.
+            file_path (str): The local path of the file.
+
+        Returns:
+            str: Hex digest of the file.
+        """
+        stat = os.stat(file_path)
+        known = self.stats.get((folder_id, name))
+        if known is not None and known[:2] == (stat.st_size, stat.st_mtime):
+            return known[2]
+        return file_md5(file_path)
+
+    def is_uploaded(self, folder_id, name, md5):
+        """
+        Checks whether a file with this name and content was already uploaded to the folder.
+
+        Args:
+            folder_id (str): The target folder ID.
+            name (str): The name of the file in the folder.
+            md5 (str): Checksum of the file.
+        """
+        return (folder_id, name, md5) in self.uploaded
+
+    def record(self, folder_id, name, file_path, md5, file_id):
+        """
+        Records a finished upload.
+
+        Args:
+            folder_id (str): The target folder ID.
+            name (str): The name of the file in the folder.
+            file_path (str): The local path of the file.
+            md5 (str): Checksum of the file.
+            file_id (str): The Drive ID of the uploaded file.
+        """
+        stat = os.stat(file_path)
+        entry = {'folder': folder_id, 'name': name, 'md5': md5, 'size': stat.st_size, 'mtime': stat.st_mtime, 'id': file_id}
+        with self.lock:
+            self.add(entry)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+class DriveUploader:
+    """
+    Uploads files to Google Drive over one authorized session with a bounded pool of workers.
+
+    Small files are sent in a single multipart request, large files by resumable uploads in chunks.
+    Requests failing with a rate limit, server error or connection error are retried with exponential backoff.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+    def __init__(self, session, ledger=None, workers=4, resumable_threshold=5 << 20, chunk_size=5 << 20,
+                 retries=5, backoff=1.0, base_url='https://www.googleapis.com'):
+        """
+        Initializes the DriveUploader.
+
+        Args:
+            session (requests.Session): Authorized session, e.g. AuthorizedSession of `load_credentials()`.
+            ledger (UploadLedger, optional): Record of uploaded files, nothing is skipped without it.
+            workers (int, optional): Number of concurrent uploads.
+            resumable_threshold (int, optional): Files of at least this many bytes use resumable uploads.
+            chunk_size (int, optional): Bytes per request of a resumable upload, a multiple of 256 KiB.
+            retries (int, optional): Retries of a failed request before the file fails.
+            backoff (float, optional): Seconds before the first retry, doubled for each next one.
+            base_url (str, optional): The Drive API address, replaced by a local server in tests.
+        """
+        if chunk_size % (256 << 10):
+            raise Exception('Chunk size has to be a multiple of 256 KiB')
+        self.session = session
+        self.ledger = ledger
+        self.workers = workers
+        self.resumable_threshold = resumable_threshold
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.base_url = base_url.rstrip('/')
+        # One connection per worker, requests keeps 10 per host by default
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def should_retry(self, response):
+        if response.status_code in self.RETRY_STATUSES:
+            return True
+        if response.status_code == 403:
+            try:
+                errors = response.json()['error']['errors']
+            except (ValueError, KeyError, TypeError):
+                return False
+            return any(error.get('reason') in self.RATE_LIMIT_REASONS for error in errors)
+        return False
+
+    def wait(self, attempt):
+        time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def request(self, method, url, ok=(200,), **kwargs):
+        """
+        Sends a request, retrying it with backoff on rate limits, server and connection errors.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Address relative to `base_url`, or absolute.
+            ok (tuple, optional): Status codes returned without raising.
+            **kwargs: Passed to `requests.Session.request`.
+
+        Returns:
+            requests.Response: The response.
+        """
+        if not url.startswith('http'):
+            url = self.base_url + url
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                self.wait(attempt)
+                continue
+            if response.status_code in ok:
+                return response
+            if attempt == self.retries or not self.should_retry(response):
+                raise Exception(f'{method} {url} failed with {response.status_code}: {response.text[:200]}')
+            self.wait(attempt)
+
+    def find_or_create_folder(self, folder_name):
+        """
+        Searches for a folder by name and creates it if it does not exist.
+
+        Args:
+            folder_name (str): The name of the folder.
+
+        Returns:
+            str: The ID of the folder.
+        """
+        query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
+        items = self.request('GET', '/drive/v3/files', params={'q': query, 'spaces': 'drive', 'fields': 'files(id, name)'}).json()['files']
+        if items:
+            return items[0]['id']
+        metadata = {'name': folder_name, 'mimeType': 'application/vnd.google-apps.folder'}
+        return self.request('POST', '/drive/v3/files', params={'fields': 'id'}, json=metadata).json()['id']
+
+    def upload_multipart(self, metadata, file_path, mime_type):
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        boundary = 'elephant_upload_' + os.urandom(8).hex()
+        body = (f'--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(metadata)}\r\n'
+                f'--{boundary}\r\nContent-Type: {mime_type}\r\n\r\n').encode() + content + f'\r\n--{boundary}--'.encode()
+        response = self.request('POST', '/upload/drive/v3/files', params={'uploadType': 'multipart', 'fields': 'id'},
+                                data=body, headers={'Content-Type': f'multipart/related; boundary={boundary}'})
+        return response.json()['id']
+
+    def upload_resumable(self, metadata, file_path, mime_type):
+        size = os.path.getsize(file_path)
+        response = self.request('POST', '/upload/drive/v3/files', params={'uploadType': 'resumable', 'fields': 'id'},
+                                json=metadata, headers={'X-Upload-Content-Type': mime_type, 'X-Upload-Content-Length': str(size)})
+        session_url = response.headers['Location']
+        offset = 0
+        stalled = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                f.seek(offset)
+                chunk = f.read(self.chunk_size)
+                end = offset + len(chunk) - 1
+                headers = {'Content-Range': f'bytes {offset}-{end}/{size}' if chunk else f'bytes */{size}'}
+                try:
+                    response = self.request('PUT', session_url, ok=(200, 201, 308), data=chunk, headers=headers)
+                except Exception:
+                    # Ask the server how much arrived and continue from there
+                    response = self.request('PUT', session_url, ok=(200, 201, 308), headers={'Content-Range': f'bytes */{size}'})
+                if response.status_code in (200, 201):
+                    return response.json()['id']
+                received = response.headers.get('Range')
+                previous, offset = offset, int(received.rsplit('-', 1)[1]) + 1 if received else 0
+                # Rounds that move no data count against the retries, so a server failing every chunk ends the upload
+                stalled = stalled + 1 if offset <= previous else 0
+                if stalled > self.retries:
+                    raise Exception(f'Resumable upload of {file_path} made no progress at byte {offset} of {size}')
+
+    def upload(self, file_path, folder_id, name=None, mime_type='image/png'):
+        """
+        Uploads a file unless the ledger already has it.
+
+        Args:
+            file_path (str): The local path of the file.
+            folder_id (str): The ID of the folder in which to upload the file.
+            name (str, optional): The name of the file in the folder, defaults to its base name.
+            mime_type (str, optional): The MIME type of the file. Defaults to 'image/png'.
+
+        Returns:
+            str: The Drive ID of the uploaded file, None if it was skipped.
+        """
+        name = os.path.basename(file_path) if name is None else name
+        md5 = self.ledger.checksum(folder_id, name, file_path) if self.ledger is not None else None
+        if self.ledger is not None and self.ledger.is_uploaded(folder_id, name, md5):
+            return None
+        metadata = {'name': name, 'parents': [folder_id]}
+        if os.path.getsize(file_path) >= self.resumable_threshold:
+            file_id = self.upload_resumable(metadata, file_path, mime_type)
+        else:
+            file_id = self.upload_multipart(metadata, file_path, mime_type)
+        if self.ledger is not None:
+            self.ledger.record(folder_id, name, file_path, md5, file_id)
+        return file_id
+
+    def upload_many(self, file_paths, folder_id, mime_type='image/png'):
+        """
+        Uploads files concurrently, a failed file does not stop the others.
+
+        Args:
+            file_paths (list): Local paths of the files.
+            folder_id (str): The ID of the folder in which to upload the files.
+            mime_type (str, optional): The MIME type of the files. Defaults to 'image/png'.
+
+        Returns:
+            dict: Counts of uploaded, skipped and failed files, uploaded bytes and seconds taken.
+        """
+        start = time.perf_counter()
+        stats = {'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.upload, path, folder_id, mime_type=mime_type): path for path in file_paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    file_id = future.result()
+                except Exception as e:
+                    print(f'Upload of {path} failed: {e}')
+                    stats['failed'] += 1
+                    continue
+                if file_id is None:
+                    stats['skipped'] += 1
+                else:
+                    stats['uploaded'] += 1
+                    stats['bytes'] += os.path.getsize(path)
+        stats['seconds'] = time.perf_counter() - start
+        return stats
+
+
+def upload_to_drive(dir, target, workers=4, ledger_path=None):
     """
     Uploads all files from a specified directory to a Google Drive folder.
 
+    Files uploaded by earlier runs are skipped, so a failed run can simply be started again.
+
     Args:
         dir (str): The directory containing files to upload.
         target (str): The name of the target folder in Google Drive.
+        workers (int, optional): Number of concurrent uploads.
+        ledger_path (str, optional): The ledger of uploaded files, defaults to .drive_uploads.jsonl in `dir`.
 
     Returns:
-        None
+        dict: Counts of uploaded, skipped and failed files, uploaded bytes and seconds taken.
     """
-    service = auth()
-    folder_id = find_or_create_folder(service, target)
-    for filename in os.listdir(dir):
-        upload_file(service, filename, os.path.join(dir, filename), folder_id)
+    if ledger_path is None:
+        ledger_path = os.path.join(dir, '.drive_uploads.jsonl')
+    uploader = DriveUploader(AuthorizedSession(load_credentials()), UploadLedger(ledger_path), workers=workers)
+    folder_id = uploader.find_or_create_folder(target)
+    paths = [os.path.join(dir, filename) for filename in sorted(os.listdir(dir))
+             if os.path.isfile(os.path.join(dir, filename)) and os.path.abspath(os.path.join(dir, filename)) != os.path.abspath(ledger_path)]
+    stats = uploader.upload_many(paths, folder_id)
+    print(f"uploaded {stats['uploaded']}, skipped {stats['skipped']}, failed {stats['failed']}, "
+          f"{stats['bytes'] / 2 ** 20 / max(stats['seconds'], 1e-9):.1f} MB/s")
+    return stats
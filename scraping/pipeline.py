@@ -0,0 +1,249 @@
+"""
+Streaming scrape-to-detect pipeline. Frames stay in memory from capture to detection, only the positions
+and optionally a compressed archive of the frames are written.
+
+Run from the repository root:
+    python -m scraping.pipeline --positions visualize/positions.csv --archive archive
+"""
+
+import os
+import sys
+import time
+import queue
+import signal
+import argparse
+import threading
+import cv2
+from datetime import datetime
+from .scraping import StreamPool, CAPTURE_MODES, crop_frame, next_slot, report_latencies
+from detector.elephant_detector import ElephantDetector
+from detector.frame_filter import FrameFilter
+from detector.yolo_writer import atomic_write
+from visualize.read_positions import detection_positions, append_positions
+
+STOP = None
+ARCHIVE_PARAMS = {
+    '.jpg': cv2.IMWRITE_JPEG_QUALITY,
+    '.webp': cv2.IMWRITE_WEBP_QUALITY
+}
+
+
+class ScrapePipeline:
+    """Capture, crop, detect and persist stages connected by bounded queues, each stage runs in its own thread."""
+
+    def __init__(self, pool, detector, positions_csv, archive_dir=None, archive_format='.jpg', archive_quality=90,
+                 frame_filter=None, batch_size=8, queue_size=16):
+        """
+        Initializes the ScrapePipeline.
+
+        Parameters:
+        - pool (StreamPool): Browsers of the cameras, opened by `run`.
+        - detector (ElephantDetector): Detector with the loaded model.
+        - positions_csv (str): Positions file the detections are appended to by `append_positions`.
+        - archive_dir (str, optional): Directory for compressed copies of the cropped frames, None keeps no frames.
+        - archive_format (str, optional): '.jpg' or '.webp'.
+        - archive_quality (int, optional): Encoder quality of the archive, 0-100.
+        - frame_filter (FrameFilter, optional): Pre-filter before detection, defaults to `FrameFilter()`.
+        - batch_size (int, optional): Maximal number of frames detected at once.
+        - queue_size (int, optional): Capacity of the queues between stages, a full queue blocks the stage before it.
+        """
+        if archive_format not in ARCHIVE_PARAMS:
+            raise Exception(f'Unsupported archive format {archive_format}, use one of {list(ARCHIVE_PARAMS)}')
+        self.pool = pool
+        self.detector = detector
+        self.positions_csv = positions_csv
+        self.archive_dir = archive_dir
+        self.archive_format = archive_format
+        self.archive_quality = archive_quality
+        self.frame_filter = frame_filter if frame_filter is not None else FrameFilter()
+        self.batch_size = batch_size
+        self.captured = queue.Queue(maxsize=queue_size)
+        self.cropped = queue.Queue(maxsize=queue_size)
+        self.detected = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.counters = {'cycles': 0, 'captured': 0, 'detected': 0, 'rows': 0, 'archived_bytes': 0, 'errors': 0}
+        if archive_dir is not None:
+            os.makedirs(archive_dir, exist_ok=True)
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.counters[key] += value
+
+    def capture_loop(self, interval_minutes=15, max_cycles=None, recycle_cycles=96, stop_event=None):
+        """
+        Grabs frames of all cameras on the time grid and passes them on as (name, frame) pairs.
+
+        Parameters:
+        - interval_minutes (int, optional): Minutes between captures, has to divide an hour.
+        - max_cycles (int, optional): Stop after this many cycles, runs until `stop_event` is set if None.
+        - recycle_cycles (int, optional): Number of cycles after which all browsers are restarted.
+        - stop_event (threading.Event, optional): Ends the loop when set.
+        """
+        cycles = 0
+        try:
+            open_times = self.pool.open()
+            while (max_cycles is None or cycles < max_cycles) and not (stop_event and stop_event.is_set()):
+                slot = next_slot(datetime.now(), interval_minutes)
+                delay = max(0.0, (slot - datetime.now()).total_seconds())
+                if stop_event is not None and stop_event.wait(delay):
+                    break
+                if stop_event is None:
+                    time.sleep(delay)
+                start = time.perf_counter()
+                frames, latencies = self.pool.grab()
+                current_time = slot.strftime("%d_%m__%H_%M")
+                for camera_num, frame in frames.items():
+                    self.captured.put((f'screenshot{camera_num}_{current_time}.png', frame))
+                self.count('captured', len(frames))
+                report_latencies(open_times, latencies, time.perf_counter() - start)
+                cycles += 1
+                self.count('cycles')
+                open_times = self.pool.recycle(latencies, everything=cycles % recycle_cycles == 0)
+        finally:
+            self.captured.put(STOP)
+
+    def crop_loop(self):
+        """
+        Crops captured frames in memory.
+        """
+        while True:
+            item = self.captured.get()
+            if item is STOP:
+                self.cropped.put(STOP)
+                return
+            name, frame = item
+            try:
+                cropped = crop_frame(frame)
+            except Exception as e:
+                print(f'Cropping {name} failed: {e}', file=sys.stderr)
+                self.count('errors')
+                continue
+            self.cropped.put((name, cropped))
+
+    def detect_loop(self):
+        """
+        Detects elephants on the cropped frames, batching the frames waiting in the queue.
+        """
+        while True:
+            batch = [self.cropped.get()]
+            while batch[-1] is not STOP and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.cropped.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is STOP
+            batch = [item for item in batch if item is not STOP]
+            if batch:
+                try:
+                    results = list(self.detector.predict_batch(batch, batch_size=len(batch), frame_filter=self.frame_filter, report=False))
+                    self.detected.put([(name, frame, result) for (name, frame), result in zip(batch, results)])
+                    self.count('detected', len(batch))
+                except Exception as e:
+                    print(f'Detection of {len(batch)} frames failed: {e}', file=sys.stderr)
+                    self.count('errors')
+            if stop:
+                self.detected.put(STOP)
+                return
+
+    def persist_loop(self):
+        """
+        Appends the detections of each batch to the positions and archives the frames.
+        """
+        while True:
+            batch = self.detected.get()
+            if batch is STOP:
+                return
+            names, boxes = [], []
+            for name, frame, result in batch:
+                if self.archive_dir is not None:
+                    try:
+                        self.archive(name, frame)
+                    except Exception as e:
+                        print(f'Archiving {name} failed: {e}', file=sys.stderr)
+                        self.count('errors')
+                names.append(name)
+                boxes.append(result.boxes.xywhn.cpu().numpy())
+            try:
+                df = detection_positions(names, boxes)
+                rows = len(df)
+                if rows:
+                    append_positions(df, self.positions_csv)
+            except Exception as e:
+                print(f'Storing positions of {len(batch)} frames failed: {e}', file=sys.stderr)
+                self.count('errors')
+                continue
+            self.count('rows', rows)
+
+    def archive(self, name, frame):
+        """
+        Stores a compressed copy of a cropped frame.
+
+        Parameters:
+        - name (str): Screenshot name of the frame.
+        - frame (numpy.ndarray): The cropped BGR frame.
+        """
+        ok, data = cv2.imencode(self.archive_format, frame, [ARCHIVE_PARAMS[self.archive_format], self.archive_quality])
+        if not ok:
+            raise Exception(f'Could not encode {name}')
+        path = os.path.join(self.archive_dir, os.path.splitext(name)[0] + self.archive_format)
+        atomic_write(path, data.tobytes())
+        self.count('archived_bytes', len(data))
+
+    def stats(self):
+        """
+        Returns the counters of the pipeline.
+
+        Returns:
+        - (dict): Cycles, captured, detected frames, appended position rows, archived bytes, errors,
+          frames skipped by the filter and the current depth of each queue.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+        stats['skipped'] = self.frame_filter.counts['blank'] + self.frame_filter.counts['duplicate']
+        stats['queues'] = {'captured': self.captured.qsize(), 'cropped': self.cropped.qsize(), 'detected': self.detected.qsize()}
+        return stats
+
+    def run(self, interval_minutes=15, max_cycles=None, recycle_cycles=96):
+        """
+        Runs all stages until `max_cycles` cycles are processed or the process is interrupted.
+
+        Parameters:
+        - interval_minutes (int, optional): Minutes between captures, has to divide an hour.
+        - max_cycles (int, optional): Stop after this many cycles, runs forever if None.
+        - recycle_cycles (int, optional): Number of cycles after which all browsers are restarted.
+        """
+        stop_event = threading.Event()
+        stages = [threading.Thread(target=self.crop_loop), threading.Thread(target=self.detect_loop),
+                  threading.Thread(target=self.persist_loop)]
+        for stage in stages:
+            stage.start()
+        capture = threading.Thread(target=self.capture_loop, args=(interval_minutes, max_cycles, recycle_cycles, stop_event))
+        capture.start()
+        try:
+            while capture.is_alive():
+                capture.join(timeout=1.0)
+        except (KeyboardInterrupt, SystemExit):
+            stop_event.set()
+            capture.join()
+        finally:
+            # The stop marker drains through the stages before browsers are quit
+            for stage in stages:
+                stage.join()
+            self.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Capture, detect and store elephant positions without intermediate files.')
+    parser.add_argument("--positions", default='positions.csv', help="Positions csv file to append to.")
+    parser.add_argument("--archive", default=None, help="Directory for compressed frames, none are kept if not set.")
+    parser.add_argument("--archive-format", default='.jpg', choices=list(ARCHIVE_PARAMS), help="Archive image format.")
+    parser.add_argument("--quality", type=int, default=90, help="Archive encoder quality.")
+    parser.add_argument("--weights", default=None, help="Model weights, defaults to yolov8l.pt.")
+    parser.add_argument("--mode", default='video', choices=CAPTURE_MODES, help="How frames are grabbed.")
+    parser.add_argument("--interval", type=int, default=15, help="Minutes between captures.")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    pipeline = ScrapePipeline(StreamPool(mode=args.mode), ElephantDetector(args.weights), args.positions,
+                              args.archive, args.archive_format, args.quality)
+    pipeline.run(args.interval)
@@ -1,5 +1,8 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
+import sys
+import signal
+import argparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 import os
@@ -11,8 +14,13 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from .drive_upload import *
 import cv2
+import base64
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 
+CAPTURE_MODES = ['screenshot', 'video', 'hls']
+
 BUTTON_NUM_TO_STREAM = {
         1: 7,
         2: 5,
@@ -26,29 +34,26 @@ BUTTON_NUM_TO_STREAM = {
 
 
 
-def scrape_one_stream(directory, driver, camera_num, current_time):
+def stream_url(camera_num):
     """
-    Captures a fullscreen screenshot of a specified camera's live stream from the Prague Zoo website.
+    Returns the url of a camera's live stream.
 
-    Parameters:
-    - directory (str): Path to save the screenshot.
-    - driver (selenium.webdriver): Selenium WebDriver for web interaction.
-    - camera_num (int): Number identifying the camera stream (1 to 8).
-    - current_time (str): Current time in string format for filename uniqueness.
+    Args:
+        camera_num (int): Number identifying the camera stream (1 to 8).
     """
-    BUTTON_NUM_TO_STREAM = {
-        1: 7,
-        2: 5,
-        3: 6,
-        4: 8,
-        5: 1,
-        6: 2,
-        7: 3,
-        8: 4}
-
     stream_num = BUTTON_NUM_TO_STREAM[camera_num]
-    url = f'https://www.zoopraha.cz/multimedia/prenos-z-udoli-slonu-zive?cam={stream_num}&res=h&start={stream_num}'
-    driver.get(url)
+    return f'https://www.zoopraha.cz/multimedia/prenos-z-udoli-slonu-zive?cam={stream_num}&res=h&start={stream_num}'
+
+
+def open_stream(driver, camera_num):
+    """
+    Opens a camera's live stream in fullscreen, ready for screenshots.
+
+    Args:
+        driver (selenium.webdriver): Selenium WebDriver for web interaction.
+        camera_num (int): Number identifying the camera stream (1 to 8).
+    """
+    driver.get(stream_url(camera_num))
     time.sleep(1)
     #driver.save_screenshot('a.png')
     try:
@@ -67,10 +72,124 @@ def scrape_one_stream(directory, driver, camera_num, current_time):
     # Replace with the correct ID or selector
     video_player = driver.find_element(By.ID, 'playerSLONI')
     action.double_click(video_player).perform()
+
+
+def capture_stream(directory, driver, camera_num, current_time):
+    """
+    Saves a cropped screenshot of a stream opened by `open_stream`.
+
+    Args:
+        directory (str): Path to save the screenshot.
+        driver (selenium.webdriver): Selenium WebDriver showing the stream.
+        camera_num (int): Number identifying the camera stream (1 to 8).
+        current_time (str): Current time in string format for filename uniqueness.
+
+    Returns:
+        str: Path to the screenshot.
+    """
     # driver.save_screenshot('b.png')
     dst = os.path.join(directory, f'screenshot{camera_num}_{current_time}.png')
     driver.save_screenshot(dst)
     crop_img(dst)
+    return dst
+
+
+def scrape_one_stream(directory, driver, camera_num, current_time):
+    """
+    Captures a fullscreen screenshot of a specified camera's live stream from the Prague Zoo website.
+
+    Parameters:
+    - directory (str): Path to save the screenshot.
+    - driver (selenium.webdriver): Selenium WebDriver for web interaction.
+    - camera_num (int): Number identifying the camera stream (1 to 8).
+    - current_time (str): Current time in string format for filename uniqueness.
+    """
+    open_stream(driver, camera_num)
+    capture_stream(directory, driver, camera_num, current_time)
+
+
+def crop_frame(image_np):
+    """
+    Crops a frame in memory to the desired size
+
+    Args:
+        image_np (numpy.ndarray): The BGR page screenshot, or a video frame placed by `fit_frame`.
+
+    Returns:
+        numpy.ndarray: The cropped frame, 1920x1000 for a 1920x1080 window.
+    """
+    h, _, _ = image_np.shape
+    return image_np[0+35:h-45]
+
+
+def fit_frame(frame, width=1920, height=1080):
+    """
+    Places a raw video frame the way the fullscreen player shows it in the screenshots: scaled to fit the window
+    with its aspect ratio kept and centered between black bars. A 16:9 stream is just resized.
+
+    Args:
+        frame (numpy.ndarray): The BGR frame at the video's own resolution.
+        width (int, optional): Window width of `create_driver`.
+        height (int, optional): Window height of `create_driver`.
+
+    Returns:
+        numpy.ndarray: The frame as it appears in a page screenshot.
+    """
+    frame_height, frame_width = frame.shape[:2]
+    scale = min(width / frame_width, height / frame_height)
+    fit_width, fit_height = int(round(frame_width * scale)), int(round(frame_height * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(frame, (fit_width, fit_height), interpolation=interpolation)
+    if (fit_width, fit_height) == (width, height):
+        return resized
+    window = np.zeros((height, width, 3), dtype=frame.dtype)
+    x0, y0 = (width - fit_width) // 2, (height - fit_height) // 2
+    window[y0:y0 + fit_height, x0:x0 + fit_width] = resized
+    return window
+
+
+def frame_offset(screenshot, frame):
+    """
+    Measures how far a fitted video frame is shifted against a page screenshot of the same moment.
+
+    Args:
+        screenshot (numpy.ndarray): The 1920x1080 page screenshot.
+        frame (numpy.ndarray): The video frame placed by `fit_frame`.
+
+    Returns:
+        tuple: Shift (dx, dy) in pixels and the correlation response, close to 1 for matching frames.
+    """
+    a = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    b = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    (dx, dy), response = cv2.phaseCorrelate(a, b, cv2.createHanningWindow(a.shape[::-1], cv2.CV_32F))
+    return dx, dy, response
+
+
+def check_alignment(driver, hls_url=None, tolerance=2.0, min_response=0.3):
+    """
+    Compares a page screenshot with a video frame of the same stream and warns when they do not line up,
+    the homographies and regions of interest were calibrated on screenshots.
+
+    Args:
+        driver (selenium.webdriver): Selenium WebDriver showing the stream.
+        hls_url (str, optional): Compare the frame decoded from this playlist instead of the <video> element.
+        tolerance (float, optional): Largest shift in pixels that is accepted.
+        min_response (float, optional): Lowest correlation response that is accepted, frames scaled differently
+            than the screenshot correlate weakly without a clear shift.
+
+    Returns:
+        tuple: Shift (dx, dy) in pixels and the correlation response.
+    """
+    png = driver.get_screenshot_as_png()
+    screenshot = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+    frame = fit_frame(grab_hls_frame(hls_url) if hls_url is not None else grab_video_frame(driver))
+    dx, dy, response = frame_offset(screenshot, frame)
+    if max(abs(dx), abs(dy)) > tolerance:
+        print(f'Video frames are shifted by ({dx:.1f}, {dy:.1f}) px against screenshots (response {response:.2f}), '
+              f'positions would move on the map')
+    elif response < min_response:
+        print(f'Video frames do not match screenshots (response {response:.2f}), they may be scaled differently')
+    return dx, dy, response
 
 
 def crop_img(dst):
@@ -81,19 +200,334 @@ def crop_img(dst):
         dst (str): The image path
     """
     image_np = cv2.imread(dst)
-    image_np = cv2.resize(image_np, (1920, 1080), interpolation=cv2.INTER_AREA)
-    h, _, _ = image_np.shape
-    image_np = image_np[0+35:h-45]
-    cv2.imwrite(dst, image_np)
+    cv2.imwrite(dst, crop_frame(image_np))
 
 
-def scraping(directory):
+# Draws the current frame of the player's video on a canvas and returns it as a png data url
+GRAB_FRAME_JS = """
+const video = document.querySelector('#playerSLONI video') || document.querySelector('video');
+if (!video || video.readyState < 2) { return null; }
+const canvas = document.createElement('canvas');
+canvas.width = video.videoWidth;
+canvas.height = video.videoHeight;
+canvas.getContext('2d').drawImage(video, 0, 0);
+return canvas.toDataURL('image/png');
+"""
+
+# Media playlists the page requested, the player streams over HLS
+HLS_URLS_JS = """
+return performance.getEntriesByType('resource').map(e => e.name).filter(n => n.includes('.m3u8'));
+"""
+
+
+def grab_video_frame(driver):
+    """
+    Copies the current frame of the stream's <video> element into memory.
+
+    Args:
+        driver (selenium.webdriver): Selenium WebDriver showing the stream.
+
+    Returns:
+        numpy.ndarray: The BGR frame at the video's own resolution.
+    """
+    data_url = driver.execute_script(GRAB_FRAME_JS)
+    if not data_url:
+        raise Exception('Video element not found or not playing')
+    data = base64.b64decode(data_url.split(',', 1)[1])
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise Exception('Video frame could not be decoded')
+    return frame
+
+
+def find_hls_url(driver):
+    """
+    Finds the HLS playlist the stream's player loaded.
+
+    Args:
+        driver (selenium.webdriver): Selenium WebDriver showing the stream.
+
+    Returns:
+        str: Url of the playlist.
+    """
+    urls = driver.execute_script(HLS_URLS_JS)
+    if not urls:
+        raise Exception('No HLS playlist requested by the page')
+    return urls[-1]
+
+
+def grab_hls_frame(url):
+    """
+    Decodes a frame of an HLS stream, or any video url OpenCV can open, into memory. FFmpeg starts
+    live playlists close to their live edge.
+
+    Args:
+        url (str): Url of the playlist or video.
+
+    Returns:
+        numpy.ndarray: The BGR frame.
+    """
+    capture = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    try:
+        ok, frame = capture.read()
+    finally:
+        capture.release()
+    if not ok:
+        raise Exception(f'No frame could be read from {url}')
+    return frame
+
+
+def capture_video(directory, driver, camera_num, current_time, hls_url=None):
+    """
+    Saves the current frame of a stream opened by `open_stream` without a page screenshot. The frame is
+    cropped in memory and encoded once.
+
+    Args:
+        directory (str): Path to save the frame.
+        driver (selenium.webdriver): Selenium WebDriver showing the stream.
+        camera_num (int): Number identifying the camera stream (1 to 8).
+        current_time (str): Current time in string format for filename uniqueness.
+        hls_url (str, optional): Decode the frame from this HLS playlist, see `find_hls_url`, instead of
+            the <video> element, e.g. when the canvas is blocked for cross-origin video.
+
+    Returns:
+        str: Path to the frame.
+    """
+    frame = grab_hls_frame(hls_url) if hls_url is not None else grab_video_frame(driver)
+    dst = os.path.join(directory, f'screenshot{camera_num}_{current_time}.png')
+    cv2.imwrite(dst, crop_frame(fit_frame(frame)))
+    return dst
+
+
+def create_driver():
+    """
+    Starts a headless Chrome with the window size of the screenshots.
+
+    Returns:
+        selenium.webdriver.Chrome: The driver.
+    """
+    chrome_options = Options()
+    
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument('window-size=1920,1080')
+    chrome_options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36")
+    chrome_options.add_argument('--no-sandbox')
+    return webdriver.Chrome(options=chrome_options)
+
+
+class StreamPool:
+    """Keeps one browser per camera with its stream open, so all cameras can be captured at the same moment."""
+
+    def __init__(self, cameras=range(1, 9), mode='screenshot'):
+        """
+        Initializes the StreamPool, browsers are started by `open`.
+
+        Args:
+            cameras (iterable, optional): Numbers of the cameras to capture.
+            mode (str, optional): 'screenshot' saves page screenshots, 'video' grabs frames of the <video>
+                element and 'hls' decodes frames of the stream's HLS playlist. Video frames of every camera are
+                compared with a screenshot once by `check_alignment`.
+        """
+        if mode not in CAPTURE_MODES:
+            raise Exception(f'Unknown capture mode {mode}, use one of {CAPTURE_MODES}')
+        self.cameras = list(cameras)
+        self.mode = mode
+        self.hls_urls = {}
+        # camera -> (dx, dy, response) of its video frames against a screenshot
+        self.offsets = {}
+        self.drivers = {}
+        self.ready = set()
+        self.executor = ThreadPoolExecutor(max_workers=len(self.cameras))
+
+    def _open_one(self, camera_num):
+        start = time.perf_counter()
+        self.ready.discard(camera_num)
+        if camera_num not in self.drivers:
+            self.drivers[camera_num] = create_driver()
+        open_stream(self.drivers[camera_num], camera_num)
+        if self.mode == 'hls':
+            self.hls_urls[camera_num] = find_hls_url(self.drivers[camera_num])
+        if self.mode != 'screenshot' and camera_num not in self.offsets:
+            try:
+                self.offsets[camera_num] = check_alignment(self.drivers[camera_num], self.hls_urls.get(camera_num))
+            except Exception as e:
+                print(f'Camera {camera_num} alignment check failed: {e}')
+        self.ready.add(camera_num)
+        return time.perf_counter() - start
+
+    def open(self, cameras=None):
+        """
+        Starts missing browsers and opens the streams of all cameras concurrently.
+
+        Args:
+            cameras (iterable, optional): Cameras to (re)open, defaults to all cameras.
+
+        Returns:
+            dict: Seconds it took to open each camera's stream, None for cameras that failed to open.
+        """
+        cameras = self.cameras if cameras is None else list(cameras)
+        futures = {camera_num: self.executor.submit(self._open_one, camera_num) for camera_num in cameras}
+        open_times = {}
+        for camera_num, future in futures.items():
+            try:
+                open_times[camera_num] = future.result()
+            except Exception as e:
+                print(f'Camera {camera_num} stream failed to open: {e}')
+                open_times[camera_num] = None
+        return open_times
+
+    def _capture_one(self, directory, camera_num, current_time, cycle_start):
+        driver = self.drivers[camera_num]
+        if self.mode == 'screenshot':
+            dst = capture_stream(directory, driver, camera_num, current_time)
+        else:
+            dst = capture_video(directory, driver, camera_num, current_time, self.hls_urls.get(camera_num))
+        return dst, time.perf_counter() - cycle_start
+
+    def capture(self, directory, current_time=None):
+        """
+        Takes screenshots of all open streams at once.
+
+        Args:
+            directory (str): The directory to save the screenshots.
+            current_time (str, optional): Time in the screenshot names, defaults to now.
+
+        Returns:
+            dict: Path to the screenshot of each camera, None for cameras whose capture failed.
+            dict: Seconds from the start of the cycle until each screenshot was stored.
+        """
+        if current_time is None:
+            current_time = datetime.now().strftime("%d_%m__%H_%M")
+        cycle_start = time.perf_counter()
+        futures = {camera_num: self.executor.submit(self._capture_one, directory, camera_num, current_time, cycle_start)
+                   for camera_num in sorted(self.ready)}
+        paths, latencies = {}, {}
+        for camera_num, future in futures.items():
+            try:
+                paths[camera_num], latencies[camera_num] = future.result()
+            except Exception as e:
+                print(f'Camera {camera_num} capture failed: {e}')
+                paths[camera_num], latencies[camera_num] = None, None
+        return paths, latencies
+
+    def _grab_one(self, camera_num, cycle_start):
+        driver = self.drivers[camera_num]
+        if self.mode == 'screenshot':
+            png = driver.get_screenshot_as_png()
+            frame = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+        elif self.mode == 'video':
+            frame = fit_frame(grab_video_frame(driver))
+        else:
+            frame = fit_frame(grab_hls_frame(self.hls_urls[camera_num]))
+        return frame, time.perf_counter() - cycle_start
+
+    def grab(self):
+        """
+        Grabs frames of all open streams at once into memory, uncropped.
+
+        Returns:
+            dict: BGR frame of each camera whose capture succeeded.
+            dict: Seconds from the start of the cycle until each frame was grabbed, None for failed cameras.
+        """
+        cycle_start = time.perf_counter()
+        futures = {camera_num: self.executor.submit(self._grab_one, camera_num, cycle_start)
+                   for camera_num in sorted(self.ready)}
+        frames, latencies = {}, {}
+        for camera_num, future in futures.items():
+            try:
+                frames[camera_num], latencies[camera_num] = future.result()
+            except Exception as e:
+                print(f'Camera {camera_num} capture failed: {e}')
+                latencies[camera_num] = None
+        return frames, latencies
+
+    def alive(self, camera_num):
+        """
+        Checks whether the browser of a camera still responds.
+
+        Args:
+            camera_num (int): The camera number.
+        """
+        try:
+            self.drivers[camera_num].current_url
+            return True
+        except Exception:
+            return False
+
+    def quit(self, camera_num):
+        """
+        Quits the browser of a camera, the next `open` starts a new one.
+
+        Args:
+            camera_num (int): The camera number.
+        """
+        self.ready.discard(camera_num)
+        driver = self.drivers.pop(camera_num, None)
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def recycle(self, latencies, everything=False):
+        """
+        Restarts browsers whose session died or whose last capture failed.
+
+        Args:
+            latencies (dict): Capture latencies of the last cycle, None for failed cameras.
+            everything (bool, optional): Restart all browsers.
+
+        Returns:
+            dict: Seconds it took to open each camera's stream, 0 for streams left open.
+        """
+        if everything:
+            broken = self.cameras
+        else:
+            broken = [camera_num for camera_num in self.cameras
+                      if latencies.get(camera_num) is None or not self.alive(camera_num)]
+        for camera_num in broken:
+            self.quit(camera_num)
+        open_times = {camera_num: 0.0 for camera_num in self.cameras}
+        open_times.update(self.open(broken))
+        return open_times
+
+    def close(self):
+        """
+        Quits all browsers.
+        """
+        for camera_num in list(self.drivers):
+            self.quit(camera_num)
+        self.executor.shutdown(wait=True)
+
+
+def report_latencies(open_times, capture_times, cycle_time):
+    """
+    Prints per-camera stream load and capture latency and the total cycle time.
+
+    Args:
+        open_times (dict): Seconds to open each camera's stream.
+        capture_times (dict): Seconds until each camera's screenshot was stored.
+        cycle_time (float): Seconds of the whole cycle.
+    """
+    for camera_num in sorted(open_times):
+        load, capture = open_times[camera_num], capture_times.get(camera_num)
+        if load is None or capture is None:
+            print(f'camera {camera_num}: failed')
+        else:
+            print(f'camera {camera_num}: load {load:.1f} s, capture {capture:.2f} s')
+    print(f'cycle {cycle_time:.1f} s')
+
+
+def scraping(directory, concurrent=False, mode='screenshot'):
     """
     Performs web scraping using Selenium, saves screenshots of a website,
     and stores them in the specified directory.
 
     Args:
         directory (str): The directory to save the screenshots.
+        concurrent (bool, optional): Open all streams in parallel browsers and capture them at once.
+        mode (str, optional): Capture mode of the concurrent capture, see `StreamPool`.
 
     Returns:
         None
@@ -104,15 +538,18 @@ def scraping(directory):
     # Setup the driver
     now = datetime.now()
     current_time = now.strftime("%d_%m__%H_%M")
-    chrome_options = Options()
-    
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument('window-size=1920,1080')
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36")
-    chrome_options.add_argument('--no-sandbox')
+    if concurrent:
+        start = time.perf_counter()
+        pool = StreamPool(mode=mode)
+        try:
+            open_times = pool.open()
+            _, capture_times = pool.capture(directory, current_time)
+        finally:
+            pool.close()
+        report_latencies(open_times, capture_times, time.perf_counter() - start)
+        return
 
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = create_driver()
     #time.sleep(1)
     for i in range(1, 9):
         scrape_one_stream(directory, driver, i, current_time)
@@ -135,18 +572,78 @@ def scrape_one_stream_whole(directory, camera_num):
     # Setup the driver
     now = datetime.now()
     current_time = now.strftime("%d_%m__%H_%M")
-    chrome_options = Options()
+    driver = create_driver()
+    try:
+        scrape_one_stream(directory, driver, camera_num, current_time)
+    finally:
+        driver.quit()
+
+
+def next_slot(now, interval_minutes=15):
+    """
+    Returns the next time on the capture grid, e.g. :00, :15, :30 and :45 for 15 minutes.
+
+    Args:
+        now (datetime): The current time.
+        interval_minutes (int, optional): Grid spacing in minutes, has to divide an hour.
+
+    Returns:
+        datetime: The first grid time after `now`.
+    """
+    slot = now.replace(minute=now.minute - now.minute % interval_minutes, second=0, microsecond=0)
+    return slot + timedelta(minutes=interval_minutes)
+
+
+def scraper_daemon(directory, interval_minutes=15, cameras=range(1, 9), recycle_cycles=96, max_cycles=None, mode='screenshot'):
+    """
+    Captures all cameras on the time grid with browsers kept open between cycles.
+
+    Browsers whose session died or whose capture failed are restarted before the next cycle, and all
+    browsers are restarted every `recycle_cycles` cycles. Browsers are quit when the daemon stops,
+    also on SIGTERM.
+
+    Args:
+        directory (str): The directory to save the screenshots, kept between cycles.
+        interval_minutes (int, optional): Minutes between captures, has to divide an hour.
+        cameras (iterable, optional): Numbers of the cameras to capture.
+        recycle_cycles (int, optional): Number of cycles after which all browsers are restarted.
+        max_cycles (int, optional): Stop after this many cycles, runs forever if None.
+        mode (str, optional): Capture mode, see `StreamPool`.
+
+    Returns:
+        None
+    """
+    assert 60 % interval_minutes == 0
+    os.makedirs(directory, exist_ok=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    pool = StreamPool(cameras, mode)
+    cycles = 0
+    try:
+        open_times = pool.open()
+        while max_cycles is None or cycles < max_cycles:
+            slot = next_slot(datetime.now(), interval_minutes)
+            time.sleep(max(0.0, (slot - datetime.now()).total_seconds()))
+            start = time.perf_counter()
+            _, capture_times = pool.capture(directory, slot.strftime("%d_%m__%H_%M"))
+            report_latencies(open_times, capture_times, time.perf_counter() - start)
+            cycles += 1
+            open_times = pool.recycle(capture_times, everything=cycles % recycle_cycles == 0)
+    finally:
+        pool.close()
 
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument('window-size=1920,1080')
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36")
-    chrome_options.add_argument('--no-sandbox')
-    driver = webdriver.Chrome(options=chrome_options)    
-    scrape_one_stream(directory, driver, camera_num, current_time)
 
 def main():
-    directory = './scraped_images'
-    scraping(directory)
+    parser = argparse.ArgumentParser(description='Capture screenshots of the elephant cameras.')
+    parser.add_argument("--directory", default='./scraped_images', help="Directory to save the screenshots.")
+    parser.add_argument("--concurrent", action='store_true', help="Capture all cameras at once.")
+    parser.add_argument("--daemon", action='store_true', help="Keep running and capture on the 15 minute grid.")
+    parser.add_argument("--interval", type=int, default=15, help="Minutes between captures of the daemon.")
+    parser.add_argument("--mode", default='screenshot', choices=CAPTURE_MODES, help="How concurrent and daemon captures grab frames.")
+    args = parser.parse_args()
+    if args.daemon:
+        scraper_daemon(args.directory, args.interval, mode=args.mode)
+    else:
+        scraping(args.directory, concurrent=args.concurrent, mode=args.mode)
     # upload_to_drive(directory, 'test_3')
 
 
@@ -0,0 +1,121 @@
+"""
+Compares full-frame detection with tiled detection on the test split of config.yaml.
+
+python benchmark_tiling.py --full runs/large/train/weights/best.pt --tiled runs/small/train/weights/best.pt
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import torch
+import yaml
+from torchvision.ops import box_iou
+sys.path.append('..')
+from detector.elephant_detector import ElephantDetector
+
+
+def read_labels(label_path, width, height):
+    """
+    Reads YOLO labels of an image as pixel boxes.
+
+    Parameters:
+    - label_path (str): Path to the label file, a missing file means no elephants.
+    - width (int): Image width.
+    - height (int): Image height.
+
+    Returns:
+    - (torch.Tensor): (N, 4) tensor of x1, y1, x2, y2.
+    """
+    if not os.path.exists(label_path):
+        return torch.zeros((0, 4))
+    with open(label_path) as f:
+        values = np.array(f.read().split(), dtype=np.float32).reshape(-1, 5)[:, 1:]
+    x, y, w, h = values[:, 0] * width, values[:, 1] * height, values[:, 2] * width, values[:, 3] * height
+    return torch.from_numpy(np.stack([x - w / 2, y - h / 2, x + w / 2, y + h / 2], axis=1))
+
+
+def match(pred, target, iou=0.5):
+    """
+    Greedily matches predictions sorted by confidence to ground truth boxes.
+
+    Parameters:
+    - pred (torch.Tensor): (N, 4) predicted boxes sorted by confidence.
+    - target (torch.Tensor): (M, 4) ground truth boxes.
+    - iou (float, optional): Minimal IoU of a match.
+
+    Returns:
+    - (int): Number of matched predictions.
+    """
+    if len(pred) == 0 or len(target) == 0:
+        return 0
+    ious = box_iou(pred, target)
+    used = torch.zeros(len(target), dtype=torch.bool)
+    matched = 0
+    for row in ious:
+        row = row.masked_fill(used, 0)
+        best = int(row.argmax())
+        if row[best] >= iou:
+            used[best] = True
+            matched += 1
+    return matched
+
+
+def evaluate(detector, images, labels_dir, tiling, conf):
+    """
+    Runs a detector on test images and measures precision, recall and latency.
+
+    Parameters:
+    - detector (ElephantDetector): The detector.
+    - images (list): Paths to the test images.
+    - labels_dir (str): Directory with their YOLO labels.
+    - tiling (tuple): (tile size, overlap) or None for full-frame detection.
+    - conf (float): Confidence threshold.
+
+    Returns:
+    - (dict): Precision, recall and milliseconds per image.
+    """
+    tp, n_pred, n_true, seconds = 0, 0, 0, 0.0
+    for path in images:
+        img = detector.load_image(path)
+        start = time.perf_counter()
+        if tiling is None:
+            result = detector.model(img, conf=conf, verbose=False, device=detector.device)[0]
+        else:
+            result = detector.predict_tiled(img, *tiling, conf=conf)
+        seconds += time.perf_counter() - start
+        height, width = img.shape[:2]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        target = read_labels(os.path.join(labels_dir, stem + '.txt'), width, height)
+        pred = result.boxes.xyxy.cpu()
+        tp += match(pred, target)
+        n_pred += len(pred)
+        n_true += len(target)
+    return {'precision': tp / n_pred if n_pred else 0.0,
+            'recall': tp / n_true if n_true else 0.0,
+            'ms_per_image': 1000 * seconds / max(1, len(images))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark tiled elephant detection.')
+    parser.add_argument("--full", default='yolov8l.pt', help="Weights used on full frames.")
+    parser.add_argument("--tiled", default='yolov8s.pt', help="Weights used on tiles.")
+    parser.add_argument("--tile-size", type=int, default=640, help="Tile size in pixels.")
+    parser.add_argument("--overlap", type=float, default=0.2, help="Overlap of neighbouring tiles.")
+    parser.add_argument("--data", default='config.yaml', help="Dataset config.")
+    parser.add_argument("--conf", type=float, default=0.5, help="Confidence threshold.")
+    args = parser.parse_args()
+
+    with open(args.data) as f:
+        config = yaml.safe_load(f)
+    images_dir = os.path.join(config['path'], config['test'])
+    labels_dir = os.path.join(config['path'], config['test'].replace('images', 'labels'))
+    images = ElephantDetector.list_images(images_dir)
+
+    runs = [('full frame', args.full, None),
+            (f'tiled {args.tile_size}px', args.tiled, (args.tile_size, args.overlap))]
+    for name, weights, tiling in runs:
+        metrics = evaluate(ElephantDetector(weights), images, labels_dir, tiling, args.conf)
+        print(f"{name:<16} {weights:<40} P {metrics['precision']:.3f} R {metrics['recall']:.3f} "
+              f"{metrics['ms_per_image']:.1f} ms/image")
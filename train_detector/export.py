@@ -0,0 +1,31 @@
+"""
+Exports trained weights for CPU inference and compares them with the PyTorch model.
+
+python export.py runs/best_run/train/weights/best.pt --formats onnx openvino --int8 --compare
+"""
+
+import argparse
+import sys
+sys.path.append('..')
+from detector.elephant_detector import ElephantDetector, EXPORT_FORMATS, compare_backends
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export elephant detection model for CPU inference.')
+    parser.add_argument("weights", help="Path to trained .pt weights.")
+    parser.add_argument("--formats", nargs='+', default=EXPORT_FORMATS, choices=EXPORT_FORMATS, help="Export formats.")
+    parser.add_argument("--int8", action='store_true', help="Also export INT8 quantized models.")
+    parser.add_argument("--data", default='config.yaml', help="Config file used for calibration and comparison.")
+    parser.add_argument("--imgsz", type=int, default=640, help="Input image size.")
+    parser.add_argument("--compare", action='store_true', help="Compare accuracy and latency on the validation split.")
+    args = parser.parse_args()
+
+    detector = ElephantDetector(args.weights)
+    paths = [args.weights]
+    for fmt in args.formats:
+        paths.append(detector.export(format=fmt, data=args.data, imgsz=args.imgsz))
+        if args.int8:
+            paths.append(detector.export(format=fmt, int8=True, data=args.data, imgsz=args.imgsz))
+    print('Exported:', *paths[1:], sep='\n')
+    if args.compare:
+        compare_backends(paths, data=args.data, split='val', imgsz=args.imgsz)
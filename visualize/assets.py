@@ -0,0 +1,77 @@
+import cv2
+from visualize.image_points import *
+
+MAPS = {}
+BACKGROUNDS = {}
+
+
+def load_image(path, size):
+    """
+    Reads an image and checks its dimensions.
+
+    Parameters:
+    - path (str): Path to the image.
+    - size (tuple): Expected (width, height) of the image.
+
+    Returns:
+    - img (numpy.ndarray): The image, read-only.
+    """
+    img = cv2.imread(path)
+    if img is None:
+        raise FileNotFoundError(f'Image {path} not found or not readable')
+    height, width = img.shape[:2]
+    if (width, height) != tuple(size):
+        raise ValueError(f'Image {path} has size {(width, height)}, expected {tuple(size)}')
+    img.setflags(write=False)
+    return img
+
+
+def get_map(camera):
+    """
+    Returns the map image of a camera, decoded once per process.
+
+    Parameters:
+    - camera (int): Camera number.
+
+    Returns:
+    - img (numpy.ndarray): The map image, read-only.
+    """
+    key = (CAMERA_to_PATH[camera], CAMERA_to_MAP[camera])
+    if key not in MAPS:
+        MAPS[key] = load_image(*key)
+    return MAPS[key]
+
+
+def get_background(camera):
+    """
+    Returns the background image of a camera, decoded once per process.
+
+    Parameters:
+    - camera (int): Camera number.
+
+    Returns:
+    - img (numpy.ndarray): The background image, read-only.
+    """
+    key = (CAMERA_to_BACKGROUND[camera], (IMG_WIDTH, IMG_HEIGHT))
+    if key not in BACKGROUNDS:
+        BACKGROUNDS[key] = load_image(*key)
+    return BACKGROUNDS[key]
+
+
+def preload(cameras=None, maps=True, backgrounds=False):
+    """
+    Loads assets ahead of time, e.g. before forking workers which then share them copy-on-write.
+
+    Parameters:
+    - cameras (list, optional): Camera numbers, defaults to all cameras.
+    - maps (bool, optional): Whether to load the map images.
+    - backgrounds (bool, optional): Whether to load the background images.
+    """
+    if cameras is None:
+        cameras = list(CAMERA_to_H)
+    for camera in cameras:
+        CAMERA_to_H[camera]
+        if maps:
+            get_map(camera)
+        if backgrounds:
+            get_background(camera)
@@ -0,0 +1,202 @@
+"""
+Benchmarks of the vectorized visualize functions against their original row-by-row versions.
+
+Run from the repository root:
+    python -m visualize.benchmark
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from visualize.image_points import *
+from visualize.perspective import transform_row, get_size, project_df, remove_duplicate_elephants, get_heatmap_new
+
+POSITIONS_CSV = os.path.join(MODULE_DIR, 'positions.csv')
+
+
+def legacy_project_df(df):
+    """
+    Original row-by-row implementation of `project_df`, kept as a reference.
+
+    Parameters:
+    - df (pandas.DataFrame): Dataframe containing the detection data with elephant coordinates.
+
+    Returns:
+    - pandas.DataFrame: New dataframe with projected map coordinates.
+    """
+    df_proj = pd.DataFrame(columns=['Camera', 'Date', 'X_center', 'Y_center', 'Width', 'Height'])
+    for index, row in df.iterrows():
+        data = {}
+        data['Camera'] = row['Camera']
+        map_width, map_height = CAMERA_to_MAP[data['Camera']]
+        H = CAMERA_to_H[data['Camera']]
+        width_real = CAMERA_to_REAL[data['Camera']]
+        data['Date'] = row['Date']
+        x, y, width, height = row['X_center'], row['Y_center'], row['Width'], row['Height']
+        x, y = x*IMG_WIDTH, y*IMG_HEIGHT
+        width, height = width*IMG_WIDTH, height*IMG_HEIGHT
+        x, y, width, height = shift(x, y, width, height, data['Camera'])
+        x_proj, y_proj = transform_row(H, x, y)
+        data['X_center'], data['Y_center'] = x_proj/map_width, y_proj/map_height
+        data['Width'], data['Height'] = get_size(map_width, map_height, width_real)
+        df_proj = pd.concat([df_proj, pd.DataFrame([data])], ignore_index=True)
+    return df_proj
+
+
+def legacy_remove_duplicate_elephants(df, threshold=0.1):
+    """
+    Original per-timestamp implementation of `remove_duplicate_elephants`, kept as a reference.
+
+    Parameters:
+    - df (pandas.DataFrame): The dataframe containing elephant detections.
+    - threshold (float, optional): The distance threshold for considering detections as duplicates.
+
+    Returns:
+    - pandas.DataFrame: The cleaned dataframe with duplicates removed.
+    """
+    def calculate_distance(row1, row2):
+        return np.linalg.norm(np.array([row1['X_center'], row1['Y_center']]) - np.array([row2['X_center'], row2['Y_center']]))
+
+    indices_to_remove = []
+    for timestamp in df['Date'].unique():
+        cam1_entries = df[(df['Camera'] == 1) & (df['Date'] == timestamp)]
+        cam2_entries = df[(df['Camera'] == 2) & (df['Date'] == timestamp)]
+        for index1, row1 in cam1_entries.iterrows():
+            for index2, row2 in cam2_entries.iterrows():
+                distance = calculate_distance(row1, row2)
+                if distance < threshold:
+                    closest_to_cam1 = cam2_entries.apply(lambda row: calculate_distance(row, row1), axis=1).idxmin()
+                    closest_to_cam2 = cam1_entries.apply(lambda row: calculate_distance(row, row2), axis=1).idxmin()
+                    if closest_to_cam1 == index2 and closest_to_cam2 == index1:
+                        assert index2 not in indices_to_remove
+                        indices_to_remove.append(index2)
+    df_cleaned = df.drop(indices_to_remove)
+    return df_cleaned
+
+
+def legacy_get_heatmap_new(df, camera, size):
+    """
+    Original row-by-row implementation of `get_heatmap_new`, kept as a reference.
+
+    Parameters:
+    - df (pandas.DataFrame): The dataframe containing detection data.
+    - camera (list): List of camera IDs for which to generate the heatmap.
+    - size (tuple): The dimensions (width, height) for the heatmap.
+
+    Returns:
+    - numpy.ndarray: The generated heatmap as a 2D numpy array.
+    """
+    df = df[df['Camera'].isin(camera)]
+    heatmap_width, heatmap_height = size
+    heatmap_img = np.zeros((heatmap_height, heatmap_width), dtype=np.float32)
+
+    def apply_bounded_gaussian_heatmap(cx, cy, w, h, heatmap):
+        left = int(max(0, cx - w/2))
+        right = int(min(heatmap_width-1, cx + w/2))
+        top = int(max(0, cy - h/2))
+        bottom = int(min(heatmap_height-1, cy + h/2))
+        if(left >= heatmap_width or right < 0) or (top >= heatmap_height or bottom < 0):
+            return
+        heatmap[top:bottom, left:right] += 1
+
+    for _, row in df.iterrows():
+        cx, cy, w, h = row['X_center'] * heatmap_width, row['Y_center'] * heatmap_height, row['Width'] * heatmap_width, row['Height'] * heatmap_height
+        apply_bounded_gaussian_heatmap(cx, cy, w, h, heatmap_img)
+    return heatmap_img
+
+
+def timed(func, *args, **kwargs):
+    """
+    Runs a function once and measures its wall time.
+
+    Parameters:
+    - func (callable): Function to run.
+    - *args, **kwargs: Arguments passed to the function.
+
+    Returns:
+    - tuple: The function result and the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def load_positions_csv(csv_file=POSITIONS_CSV):
+    """
+    Loads the shipped positions dataset with parsed dates.
+
+    Parameters:
+    - csv_file (str): Path to the positions csv file.
+
+    Returns:
+    - pandas.DataFrame: The positions dataframe.
+    """
+    df = pd.read_csv(csv_file)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+def bench_project_df(df):
+    """
+    Compares `project_df` with the original implementation and prints timings.
+
+    Parameters:
+    - df (pandas.DataFrame): Positions dataframe to project.
+    """
+    expected, legacy_time = timed(legacy_project_df, df)
+    result, new_time = timed(project_df, df)
+    for col in ['X_center', 'Y_center', 'Width', 'Height']:
+        assert np.array_equal(result[col].to_numpy(dtype=np.float64), expected[col].to_numpy(dtype=np.float64)), col
+    assert (result['Camera'].to_numpy() == expected['Camera'].to_numpy(dtype=np.int64)).all()
+    assert (result['Date'].to_numpy() == pd.to_datetime(expected['Date']).to_numpy()).all()
+    print(f'project_df: {len(df)} rows, legacy {legacy_time:.3f}s, vectorized {new_time:.4f}s, '
+          f'speedup {legacy_time / new_time:.0f}x')
+
+
+def bench_remove_duplicate_elephants(df_proj):
+    """
+    Compares `remove_duplicate_elephants` with the original implementation and prints timings.
+
+    Parameters:
+    - df_proj (pandas.DataFrame): Projected positions dataframe.
+    """
+    expected, legacy_time = timed(legacy_remove_duplicate_elephants, df_proj)
+    result, new_time = timed(remove_duplicate_elephants, df_proj)
+    assert result.index.equals(expected.index)
+    print(f'remove_duplicate_elephants: {len(df_proj)} rows, {len(df_proj) - len(result)} removed, '
+          f'legacy {legacy_time:.3f}s, vectorized {new_time:.4f}s, speedup {legacy_time / new_time:.0f}x')
+
+
+def bench_get_heatmap_new(df, df_proj):
+    """
+    Compares `get_heatmap_new` with the original implementation and prints timings.
+
+    Parameters:
+    - df (pandas.DataFrame): Positions dataframe in image coordinates.
+    - df_proj (pandas.DataFrame): Projected positions dataframe.
+    """
+    cases = [(df_proj, [1, 2], CAMERA_to_MAP[1])]
+    cases += [(df_proj, [camera], CAMERA_to_MAP[camera]) for camera in [4, 6, 7]]
+    cases += [(df, [camera], (IMG_WIDTH, IMG_HEIGHT)) for camera in [1, 2, 4, 6, 7]]
+    legacy_time, new_time = 0, 0
+    for data, camera, size in cases:
+        expected, elapsed = timed(legacy_get_heatmap_new, data, camera, size)
+        legacy_time += elapsed
+        result, elapsed = timed(get_heatmap_new, data, camera, size)
+        new_time += elapsed
+        assert result.dtype == expected.dtype and np.array_equal(result, expected), camera
+    print(f'get_heatmap_new: {len(cases)} heatmaps, legacy {legacy_time:.3f}s, vectorized {new_time:.4f}s, '
+          f'speedup {legacy_time / new_time:.0f}x')
+
+
+def main():
+    df = load_positions_csv()
+    bench_project_df(df)
+    df_proj = project_df(df)
+    bench_remove_duplicate_elephants(df_proj)
+    bench_get_heatmap_new(df, df_proj)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,30 @@ from visualize.perspective import *
 from visualize.layout import *
 from visualize.image_points import *
 from visualize.helper import *
+from visualize.heatmap_cube import *
+from visualize.assets import get_map, get_background, preload
+from visualize.render_cache import RenderCache, hash_data, hash_arrays, hash_files, DATA_COLS
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
 
 
 
-def create_full_heatmap(df, save_path, days_interval=10, min_scale=20, title=None):
+FULL_HEATMAP_HEIGHT = 840
+
+def full_heatmaps(df):
+    """
+    Generates raw heatmaps for the four map views of the full heatmap.
+
+    Parameters:
+    - df (DataFrame): Data containing projected coordinates and camera information.
+
+    Returns:
+    - raw_heatmaps (list): Heatmaps for the views of cameras 1 and 2, 4, 6 and 7.
+    """
+    return [get_heatmap_new(df, cameras, CAMERA_to_MAP[cameras[0]]) for cameras in FULL_HEATMAP_CAMERAS]
+
+def create_full_heatmap(df, save_path, days_interval=10, min_scale=20, title=None, raw_heatmaps=None, cache=None, matplotlib_colorbar=False):
     """
     Creates and saves a full heatmap combining multiple camera views with color normalization.
 
@@ -18,13 +37,21 @@ def create_full_heatmap(df, save_path, days_interval=10, min_scale=20, title=Non
     - days_interval (int, optional): The number of days over which the data spans. Used for scaling.
     - min_scale (int, optional): Minimum scale for heatmap intensity.
     - title (str, optional): Title for the heatmap, displayed via the colorbar.
+    - raw_heatmaps (list, optional): Precomputed heatmaps as returned by `full_heatmaps`, `df` is ignored when given.
+    - cache (RenderCache, optional): Cache of rendered images keyed by the data and all parameters.
+    - matplotlib_colorbar (bool, optional): Draw the colorbar with matplotlib (`add_colorbar`) instead of `compose_colorbar`.
     """
-    camera_ids = [2, 4, 6, 7]
-    raw_heatmaps = []
-    heatmap_1 = get_heatmap_new(df, [1,2], CAMERA_to_MAP[1])
-    raw_heatmaps.append(heatmap_1)
-    for camera in camera_ids[1:]:
-        raw_heatmaps.append(get_heatmap_new(df, [camera], CAMERA_to_MAP[camera]))
+    if cache is not None:
+        if raw_heatmaps is None:
+            data_hash = hash_data(df[df['Camera'].isin(sum(FULL_HEATMAP_CAMERAS, []))])
+        else:
+            data_hash = hash_arrays(*raw_heatmaps)
+        key = cache.key('full', data_hash, days_interval, min_scale, title, matplotlib_colorbar,
+                        hash_files(*[CAMERA_to_PATH[cameras[0]] for cameras in FULL_HEATMAP_CAMERAS]))
+        if cache.get_file(key, save_path):
+            return
+    if raw_heatmaps is None:
+        raw_heatmaps = full_heatmaps(df)
     global_max = np.max([np.max(heatmap) for heatmap in raw_heatmaps])
 
     def normalize_and_apply_colormap(heatmap, global_max, min_scale=min_scale):
@@ -40,20 +67,20 @@ def create_full_heatmap(df, save_path, days_interval=10, min_scale=20, title=Non
     normalized_heatmaps = [normalize_and_apply_colormap(heatmap, global_max) for heatmap in raw_heatmaps]
 
     
-    original_img = cv2.imread(CAMERA_to_PATH[1])
+    original_img = get_map(1)
     # plot_images(original_img)
     heatmap_color = normalized_heatmaps[0]
     overlayed_img1 = cv2.addWeighted(original_img, 0.8, heatmap_color, 1, 0)
     
-    original_img = cv2.imread(CAMERA_to_PATH[7])
+    original_img = get_map(7)
     heatmap_color = normalized_heatmaps[3]
     overlayed_img7 = cv2.addWeighted(original_img, 0.8, heatmap_color, 1, 0)
     
-    original_img = cv2.imread(CAMERA_to_PATH[6])
+    original_img = get_map(6)
     heatmap_color = normalized_heatmaps[2]
     overlayed_img6 = cv2.addWeighted(original_img, 0.8, heatmap_color, 1, 0)
     
-    original_img = cv2.imread(CAMERA_to_PATH[4])
+    original_img = get_map(4)
     heatmap_color = normalized_heatmaps[1]
     overlayed_img4 = cv2.addWeighted(original_img, 0.8, heatmap_color, 1, 0)
 
@@ -61,10 +88,15 @@ def create_full_heatmap(df, save_path, days_interval=10, min_scale=20, title=Non
 
     max_per_day = global_max/days_interval
     
-    fig = add_colorbar(final_layout, max_per_day/min_scale, max_per_day, title)
-    fig.savefig(save_path, bbox_inches='tight')
+    if matplotlib_colorbar:
+        fig = add_colorbar(final_layout, max_per_day/min_scale, max_per_day, title)
+        fig.savefig(save_path, bbox_inches='tight')
+    else:
+        cv2.imwrite(save_path, compose_colorbar(final_layout, max_per_day/min_scale, max_per_day, title, height=FULL_HEATMAP_HEIGHT))
+    if cache is not None:
+        cache.put_file(key, save_path)
 
-def one_heatmap(df, camera, min_scale=20):
+def one_heatmap(df, camera, min_scale=20, cache=None):
     """
     Generates a heatmap for a single camera.
 
@@ -72,10 +104,17 @@ def one_heatmap(df, camera, min_scale=20):
     - df (DataFrame): Data containing coordinates for heatmap generation.
     - camera (list): List containing the camera number for which the heatmap is generated.
     - min_scale (int, optional): Minimum scale for heatmap intensity.
+    - cache (RenderCache, optional): Cache of rendered images keyed by the data and all parameters.
     
     Returns:
     - overlayed_img (ndarray): The original camera image overlayed with the heatmap.
     """
+    if cache is not None:
+        key = cache.key('one', hash_data(df[df['Camera'].isin(camera)]), list(camera), min_scale,
+                        hash_files(CAMERA_to_PATH[camera[0]]))
+        overlayed_img = cache.get_image(key)
+        if overlayed_img is not None:
+            return overlayed_img
     heatmap = get_heatmap_new(df, camera, CAMERA_to_MAP[camera[0]])
     global_max = np.max(heatmap)
     heatmap_scaled = (heatmap / global_max) * 255 
@@ -85,14 +124,16 @@ def one_heatmap(df, camera, min_scale=20):
     heatmap_color = cv2.applyColorMap(heatmap_scaled, cv2.COLORMAP_JET)
     heatmap_color[zero_mask] = (0,0,0)
     
-    original_img = cv2.imread(CAMERA_to_PATH[camera[0]])
+    original_img = get_map(camera[0])
     overlayed_img = cv2.addWeighted(original_img, 0.8, heatmap_color, 1, 0)
+    if cache is not None:
+        cache.put_image(key, overlayed_img)
     # plt.figure()
     # plt.imshow(overlayed_img[..., ::-1]) 
     # plt.show()
     return overlayed_img
 
-def one_heatmap_background(df, camera, background_img, min_scale=3):
+def one_heatmap_background(df, camera, background_img, min_scale=3, heatmap=None, cache=None):
     """
     Generates a heatmap for a single camera over a specified background image.
 
@@ -101,11 +142,20 @@ def one_heatmap_background(df, camera, background_img, min_scale=3):
     - camera (list): List containing the camera number for which the heatmap is generated.
     - background_img (ndarray): Background image over which the heatmap is overlayed.
     - min_scale (int, optional): Minimum scale for heatmap intensity.
+    - heatmap (ndarray, optional): Precomputed heatmap, e.g. from `around_heatmap`, `df` is ignored when given.
+    - cache (RenderCache, optional): Cache of rendered images keyed by the data and all parameters.
     
     Returns:
     - overlayed_img (ndarray): The background image overlayed with the heatmap.
     """
-    heatmap = get_heatmap_new(df, camera, (IMG_WIDTH, IMG_HEIGHT))
+    if cache is not None:
+        data_hash = hash_arrays(heatmap) if heatmap is not None else hash_data(df[df['Camera'].isin(camera)])
+        key = cache.key('background', data_hash, list(camera), min_scale, hash_arrays(background_img))
+        overlayed_img = cache.get_image(key)
+        if overlayed_img is not None:
+            return overlayed_img
+    if heatmap is None:
+        heatmap = get_heatmap_new(df, camera, (IMG_WIDTH, IMG_HEIGHT))
     global_max = np.max(heatmap)
     heatmap_scaled = (heatmap / global_max) * 255 
     heatmap_scaled = np.clip(heatmap_scaled, 0, 255).astype(np.uint8)  
@@ -116,9 +166,11 @@ def one_heatmap_background(df, camera, background_img, min_scale=3):
     
     original_img = background_img
     overlayed_img = cv2.addWeighted(original_img, 1, heatmap_color, 0.5, 0)
+    if cache is not None:
+        cache.put_image(key, overlayed_img)
     return overlayed_img
 
-def one_heatmap_raw(df, camera, min_scale=20):
+def one_heatmap_raw(df, camera, min_scale=20, cache=None):
     """
     Generates a heatmap for a single camera.
 
@@ -126,10 +178,17 @@ def one_heatmap_raw(df, camera, min_scale=20):
     - df (DataFrame): Data containing coordinates for heatmap generation.
     - camera (list): List containing the camera number for which the heatmap is generated.
     - min_scale (int, optional): Minimum scale for heatmap intensity.
+    - cache (RenderCache, optional): Cache of rendered images keyed by the data and all parameters.
     
     Returns:
     - overlayed_img (ndarray): The original camera image overlayed with the heatmap.
     """
+    if cache is not None:
+        key = cache.key('raw', hash_data(df[df['Camera'].isin(camera)]), list(camera), min_scale,
+                        hash_files(CAMERA_to_BACKGROUND[camera[0]]))
+        overlayed_img = cache.get_image(key)
+        if overlayed_img is not None:
+            return overlayed_img
     heatmap = get_heatmap_new(df, camera, (IMG_WIDTH, IMG_HEIGHT))
     global_max = np.max(heatmap)
     heatmap_scaled = (heatmap / global_max) * 255 
@@ -139,8 +198,10 @@ def one_heatmap_raw(df, camera, min_scale=20):
     heatmap_color = cv2.applyColorMap(heatmap_scaled, cv2.COLORMAP_JET)
     heatmap_color[zero_mask] = (0,0,0)
     
-    original_img = cv2.imread(CAMERA_to_BACKGROUND[camera[0]])
+    original_img = get_background(camera[0])
     overlayed_img = cv2.addWeighted(original_img, 0.8, heatmap_color, 1, 0)
+    if cache is not None:
+        cache.put_image(key, overlayed_img)
     # plt.figure()
     # plt.imshow(overlayed_img[..., ::-1]) 
     # plt.show()
@@ -164,7 +225,34 @@ def is_within_time_window(row_time, current_time, delta=timedelta(minutes=15)):
     return current_datetime - delta <= row_datetime <= current_datetime + delta
 
 
-def heatmap_by_hour(df_proj, hour_sampling, days_interval, save_dir='tmp_heatmaps', show=True):
+def init_render_worker():
+    """
+    Switches a render worker process to the non-interactive Agg backend.
+    """
+    matplotlib.use('Agg')
+
+def render_window(df, save_path, title, days_interval, raw_heatmaps, cache_dir, max_bytes):
+    """
+    Renders one time window of `heatmap_by_hour` in a worker process.
+
+    Parameters:
+    - df (DataFrame): Projected data of the time window.
+    - save_path (str): Path to save the resulting heatmap image.
+    - title (str): Title of the time window.
+    - days_interval (int): The number of days over which the data spans, used for scaling.
+    - raw_heatmaps (list): Precomputed heatmaps of the window or None.
+    - cache_dir (str): Directory of the shared render cache.
+    - max_bytes (int): Size limit of the shared render cache.
+
+    Returns:
+    - image (ndarray): The rendered heatmap.
+    - stats (dict): Cache statistics of the worker.
+    """
+    cache = RenderCache(cache_dir, max_bytes)
+    create_full_heatmap(df=df, save_path=save_path, title=title, days_interval=days_interval, raw_heatmaps=raw_heatmaps, cache=cache)
+    return cv2.imread(save_path), cache.stats()
+
+def heatmap_by_hour(df_proj, hour_sampling, days_interval, save_dir='tmp_heatmaps', show=True, cube_dir=None, cache=None, workers=None):
     """
     Generates and saves heatmaps for different time windows within a day.
 
@@ -173,6 +261,11 @@ def heatmap_by_hour(df_proj, hour_sampling, days_interval, save_dir='tmp_heatmap
     - hour_sampling (int): The interval in hours to divide the day for separate heatmaps.
     - days_interval (int): The number of days over which the data spans, used for scaling.
     - save_dir (str): Path to directory where the heatmaps will be stored
+    - cube_dir (str, optional): Directory with heatmap cubes of `df_proj`, see `full_heatmap_cubes`.
+      When given, the windows are summed from the cubes instead of being recomputed from the rows.
+    - cache (RenderCache, optional): Cache of rendered windows, defaults to a cache in `save_dir`/.cache.
+    - workers (int, optional): Number of processes rendering the windows in parallel. Each window is still
+      normalized by its own maximum, exactly as in the serial mode.
     """
     df_proj['Hour'] = df_proj['Date'].dt.hour
     def map_to_time_window(hour):
@@ -182,22 +275,41 @@ def heatmap_by_hour(df_proj, hour_sampling, days_interval, save_dir='tmp_heatmap
     df_proj[['Hour', 'Time_Window']]
     time_windows = df_proj['Time_Window'].unique().tolist()
     time_windows.sort()
-    def all_heatmaps_exist(time_windows):
-        for tw in time_windows:
-            save_path = f'{save_dir}/he{tw}.png'
-            if not os.path.exists(save_path):
-                return False  
-        return True 
-    if not all_heatmaps_exist(time_windows):
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-        for tw in time_windows:
-            df = df_proj[df_proj['Time_Window'] == tw]
-            create_full_heatmap(df=df, save_path=f'{save_dir}/he{tw}.png', title=tw, days_interval=days_interval)
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+    if cache is None:
+        cache = RenderCache(os.path.join(save_dir, '.cache'))
+    hits = cache.hits
+    cubes = None
+    if cube_dir is not None:
+        cubes = full_heatmap_cubes(df_proj, cube_dir)
+    jobs = []
+    for tw in time_windows:
+        df = df_proj[df_proj['Time_Window'] == tw][DATA_COLS]
+        raw_heatmaps = None
+        if cubes is not None:
+            start_hour = int(tw[:2])
+            raw_heatmaps = [window_heatmap(cube, start_hour * 60, (start_hour + hour_sampling) * 60 % MINUTES_PER_DAY) for cube in cubes]
+        jobs.append((df, f'{save_dir}/he{tw}.png', tw, days_interval, raw_heatmaps))
+
+    if workers is not None and workers > 1:
+        # Decoded once here, forked workers share the arrays
+        preload([cameras[0] for cameras in FULL_HEATMAP_CAMERAS])
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker) as executor:
+            futures = [executor.submit(render_window, *job, cache.cache_dir, cache.max_bytes) for job in jobs]
+            images = []
+            for future in futures:
+                image, stats = future.result()
+                images.append(image)
+                cache.hits += stats['hits']
+                cache.misses += stats['misses']
+                cache.evictions += stats['evictions']
     else:
+        for df, save_path, tw, days_interval, raw_heatmaps in jobs:
+            create_full_heatmap(df=df, save_path=save_path, title=tw, days_interval=days_interval, raw_heatmaps=raw_heatmaps, cache=cache)
+        images = [cv2.imread(save_path) for _, save_path, _, _, _ in jobs]
+    if cache.hits - hits == len(time_windows):
         print('Heatmaps already cached.')
-    image_paths = [f"{save_dir}/he{x}.png" for x in time_windows]
-    images = [cv2.imread(path) for path in image_paths]
     rows = [cv2.hconcat(images[i:i+int(24/hour_sampling/4)]) for i in range(0, 24//hour_sampling, int(24/hour_sampling/4))]
     # Vertically concatenate the rows to form the final grid
     stacked_image = cv2.vconcat(rows)
@@ -0,0 +1,150 @@
+import os
+import numpy as np
+from visualize.perspective import get_heatmap_new
+from visualize.image_points import *
+from visualize.render_cache import hash_data, DATA_COLS
+
+BUCKET_MINUTES = 15
+MINUTES_PER_DAY = 24 * 60
+FULL_HEATMAP_CAMERAS = [[1, 2], [4], [6], [7]]
+
+
+def cube_path(save_dir, cameras):
+    """
+    Returns the path of a heatmap cube stored in a directory.
+
+    Parameters:
+    - save_dir (str): Directory with the cubes.
+    - cameras (list): Camera IDs accumulated in the cube.
+
+    Returns:
+    - (str): Path to the .npy file.
+    """
+    return os.path.join(save_dir, 'cube' + ''.join(str(camera) for camera in cameras) + '.npy')
+
+
+def build_heatmap_cube(df, camera, size, path, bucket_minutes=BUCKET_MINUTES):
+    """
+    Precomputes heatmaps for every time-of-day bucket and stores them as one array on disk.
+
+    Parameters:
+    - df (DataFrame): Data containing coordinates, camera information and dates.
+    - camera (list): List of camera IDs for which to generate the heatmaps.
+    - size (tuple): The dimensions (width, height) for the heatmaps.
+    - path (str): Path to the output .npy file.
+    - bucket_minutes (int, optional): Length of one time bucket in minutes, has to divide a day.
+
+    Returns:
+    - cube (numpy.memmap): Array of shape (buckets, height, width), read-only.
+    """
+    assert MINUTES_PER_DAY % bucket_minutes == 0
+    width, height = size
+    df = df[df['Camera'].isin(camera)]
+    minutes = (df['Date'].dt.hour * 60 + df['Date'].dt.minute).to_numpy()
+    buckets = minutes // bucket_minutes
+
+    tmp_path = path + '.tmp.npy'
+    cube = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                     shape=(MINUTES_PER_DAY // bucket_minutes, height, width))
+    for bucket in range(cube.shape[0]):
+        cube[bucket] = get_heatmap_new(df[buckets == bucket], camera, size)
+    cube.flush()
+    del cube
+    os.replace(tmp_path, path)
+    return load_heatmap_cube(path)
+
+
+def load_heatmap_cube(path):
+    """
+    Memory-maps a heatmap cube stored by `build_heatmap_cube`.
+
+    Parameters:
+    - path (str): Path to the .npy file.
+
+    Returns:
+    - cube (numpy.memmap): Array of shape (buckets, height, width), read-only.
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def full_heatmap_cubes(df, save_dir, bucket_minutes=BUCKET_MINUTES, rebuild=False):
+    """
+    Loads cubes for the four map views of the full heatmap, building the missing ones.
+
+    Parameters:
+    - df (DataFrame): Projected data containing coordinates, camera information and dates.
+    - save_dir (str): Directory with the cubes.
+    - bucket_minutes (int, optional): Length of one time bucket in minutes.
+    - rebuild (bool, optional): Rebuild the cubes even if they were built from the same data.
+
+    Returns:
+    - cubes (list): Cubes for the views of cameras 1 and 2, 4, 6 and 7.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    # Cubes built from other data are rebuilt
+    hash_path = os.path.join(save_dir, 'data.sha1')
+    data_hash = f"{hash_data(df, DATA_COLS + ['Date'])}:{bucket_minutes}"
+    if os.path.exists(hash_path):
+        with open(hash_path) as f:
+            rebuild = rebuild or f.read() != data_hash
+    else:
+        rebuild = True
+    cubes = []
+    for cameras in FULL_HEATMAP_CAMERAS:
+        path = cube_path(save_dir, cameras)
+        if os.path.exists(path) and not rebuild:
+            cube = load_heatmap_cube(path)
+        else:
+            cube = build_heatmap_cube(df, cameras, CAMERA_to_MAP[cameras[0]], path, bucket_minutes)
+        cubes.append(cube)
+    with open(hash_path, 'w') as f:
+        f.write(data_hash)
+    return cubes
+
+
+def window_heatmap(cube, start_minute, end_minute):
+    """
+    Sums the buckets of a cube falling into a time-of-day window.
+
+    A bucket belongs to the window when its start lies in [start_minute, end_minute). Windows whose end
+    is not after their start wrap around midnight.
+
+    Parameters:
+    - cube (numpy.ndarray): Cube as returned by `build_heatmap_cube`.
+    - start_minute (int): Start of the window in minutes after midnight.
+    - end_minute (int): End of the window in minutes after midnight, exclusive.
+
+    Returns:
+    - heatmap (numpy.ndarray): The summed heatmap.
+    """
+    bucket_minutes = MINUTES_PER_DAY // cube.shape[0]
+    first = -(-start_minute // bucket_minutes)
+    last = -(-end_minute // bucket_minutes)
+    if start_minute < end_minute:
+        return cube[first:last].sum(axis=0, dtype=np.float32)
+    return cube[first:].sum(axis=0, dtype=np.float32) + cube[:last].sum(axis=0, dtype=np.float32)
+
+
+def around_heatmap(cube, current_time, delta):
+    """
+    Sums the buckets of a cube around a time of day, like filtering with `is_within_time_window`.
+
+    Both ends of the window are inclusive and the window does not wrap around midnight. The result equals
+    the filtered heatmap when all dates lie on bucket starts, as the quarter-hour scraped labels do.
+
+    Parameters:
+    - cube (numpy.ndarray): Cube as returned by `build_heatmap_cube`.
+    - current_time (datetime.time): Centre of the window.
+    - delta (timedelta): Half width of the window.
+
+    Returns:
+    - heatmap (numpy.ndarray): The summed heatmap.
+    """
+    minute = current_time.hour * 60 + current_time.minute + current_time.second / 60
+    delta_minutes = delta.total_seconds() / 60
+    start_minute = max(0, minute - delta_minutes)
+    end_minute = min(MINUTES_PER_DAY - 1, minute + delta_minutes)
+    bucket_minutes = MINUTES_PER_DAY // cube.shape[0]
+    first = int(np.ceil(start_minute / bucket_minutes))
+    last = int(np.floor(end_minute / bucket_minutes))
+    return cube[first:last + 1].sum(axis=0, dtype=np.float32)
@@ -1,6 +1,7 @@
 import numpy as np
 import cv2
 import os
+from collections.abc import Mapping
 
 ELEPHANT_SIZE = 2.5
 IMG_WIDTH, IMG_HEIGHT = 1920, 1000
@@ -19,31 +20,59 @@ MAP_REAL_WIDTH_7 = 18
 
 IMAGE_PTS_1 = np.array([[342, 272], [1346, 120], [1320, 396], [598, 410]])
 MAP_PTS_1 = np.array([[162, 464],  [12, 153], [272, 202], [272, 370]])
-H1, _ = cv2.findHomography(IMAGE_PTS_1, MAP_PTS_1)
 
 IMAGE_PTS_2 = np.array([[35, 447], [1050, 299], [912, 405], [281, 513]])
 MAP_PTS_2 = np.array([[678, 153],  [673, 463], [592, 372], [592, 200]])
-H2, _ = cv2.findHomography(IMAGE_PTS_2, MAP_PTS_2)
 
 IMAGE_PTS_4 = np.array([[748, 340],[1711, 375], [1778, 148],[1044, 91],  [430, 55],[175, 151]])
 MAP_PTS_4 = np.array([ [456, 411], [619, 411], [700, 174], [470, 170], [147, 43], [43, 128]])
-H4, _ = cv2.findHomography(IMAGE_PTS_4, MAP_PTS_4)
 
 IMAGE_PTS_6 = np.array([[1394, 416], [1158, 326], [248, 428], [600, 342]])
 MAP_PTS_6 = np.array([[563, 62], [360, 32], [363, 391], [95, 263]])
-H6, _ = cv2.findHomography(IMAGE_PTS_6, MAP_PTS_6)
 
 IMAGE_PTS_7 = np.array([[711, 544],[1353, 564], [1651, 402],[633, 187]])
 MAP_PTS_7 = np.array([ [347, 241], [347, 369], [444, 464], [598, 192]])
-H7, _ = cv2.findHomography(IMAGE_PTS_7, MAP_PTS_7)
-
-CAMERA_to_H = {
-    1: H1,
-    2: H2,
-    4: H4,
-    6: H6,
-    7: H7
-}
+
+class LazyHomographies(Mapping):
+    """Homographies from camera image to map coordinates, each computed on first use."""
+
+    def __init__(self, points):
+        """
+        Initializes the LazyHomographies.
+
+        Parameters:
+        - points (dict): Camera number to a pair of image and map calibration points.
+        """
+        self.points = points
+        self.homographies = {}
+
+    def __getitem__(self, camera):
+        if camera not in self.homographies:
+            image_pts, map_pts = self.points[camera]
+            H, _ = cv2.findHomography(image_pts, map_pts)
+            H.setflags(write=False)
+            self.homographies[camera] = H
+        return self.homographies[camera]
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+CAMERA_to_H = LazyHomographies({
+    1: (IMAGE_PTS_1, MAP_PTS_1),
+    2: (IMAGE_PTS_2, MAP_PTS_2),
+    4: (IMAGE_PTS_4, MAP_PTS_4),
+    6: (IMAGE_PTS_6, MAP_PTS_6),
+    7: (IMAGE_PTS_7, MAP_PTS_7)
+})
+
+def __getattr__(name):
+    # H1, H2, ... are computed on first access
+    if name in ['H1', 'H2', 'H4', 'H6', 'H7']:
+        return CAMERA_to_H[int(name[1])]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 CAMERA_to_MAP = {
     1: (MAP_WIDTH_12, MAP_HEIGHT_12),
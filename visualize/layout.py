@@ -2,6 +2,7 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib as mpl
+import unicodedata
 
 def create_layout(overlayed_img1, overlayed_img4 , overlayed_img6, overlayed_img7):
     """
@@ -121,4 +122,101 @@ def add_colorbar_image(image, min_val, max_val, title=None, show=False):
         plt.close()
     #fig.tight_layout()
     fig.subplots_adjust(top=0.90)
-    return fig
\ No newline at end of file
+    return fig
+
+COLORBAR_LABEL = 'Průměrný počet slonů'
+
+def ascii_text(text):
+    """
+    Strips diacritics and replaces characters the OpenCV Hershey fonts cannot draw.
+
+    Parameters:
+    - text (str): The text to convert.
+
+    Returns:
+    - (str): The ASCII text.
+    """
+    text = text.replace('–', '-')
+    text = unicodedata.normalize('NFKD', text)
+    return text.encode('ascii', 'ignore').decode('ascii')
+
+def compose_colorbar(image, min_val, max_val, title=None, label=COLORBAR_LABEL, height=None):
+    """
+    Adds a vertical JET colorbar with ticks, label and title to an image without matplotlib.
+
+    The layout follows `add_colorbar`. The text is drawn with OpenCV fonts which have no diacritics, so the title
+    and label lose them, e.g. the default label reads 'Prumerny pocet slonu'. The tick label column and title band
+    are sized from the widest expected tick label and the tallest glyphs, so images of the same size with
+    different values and titles get the same size and can be concatenated into a grid.
+
+    Parameters:
+    - image (numpy.ndarray): The input image to which the colorbar will be added.
+    - min_val (float): Minimum value for the colorbar scale.
+    - max_val (float): Maximum value for the colorbar scale.
+    - title (str, optional): Title above the image. Defaults to None.
+    - label (str, optional): Label of the colorbar.
+    - height (int, optional): Height the image is resized to, keeping its aspect ratio. Defaults to the image height.
+
+    Returns:
+    - composed (numpy.ndarray): The image with the colorbar.
+    """
+    if height is not None and height != image.shape[0]:
+        width = int(round(image.shape[1] * height / image.shape[0]))
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    img_height, img_width = image.shape[:2]
+
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = max(0.35, img_height / 1800)
+    thickness = max(1, int(round(font_scale * 1.5)))
+    title_scale = font_scale * 1.6
+    pad = int(round(img_height * 0.02))
+    bar_width = max(8, int(round(img_width / 20)))
+    gap = max(4, int(round(bar_width * 0.5)))
+    tick_len = max(3, int(round(bar_width * 0.2)))
+
+    tick_values = np.linspace(min_val, max_val, num=11)
+    tick_labels = [f'{float(val):.2f}' for val in tick_values]
+    (_, text_height), _ = cv2.getTextSize('0', font, font_scale, thickness)
+    # Tick labels up to -999.99 fit into the column, wider ones widen it
+    labels_width = max(cv2.getTextSize(text, font, font_scale, thickness)[0][0] for text in tick_labels + ['-999.99'])
+    label = ascii_text(label)
+    (label_width, label_height), label_base = cv2.getTextSize(label, font, font_scale, thickness)
+
+    top = pad
+    if title is not None:
+        title = ascii_text(title)
+        (title_width, _), _ = cv2.getTextSize(title, font, title_scale, thickness)
+        # The band fits the tallest glyphs whatever the title is
+        (_, title_height), title_base = cv2.getTextSize('Ag|', font, title_scale, thickness)
+        top = pad + title_height + title_base + pad
+    bar_left = img_width + gap
+    labels_left = bar_left + bar_width + tick_len + pad // 2
+    label_left = labels_left + labels_width + pad
+    canvas_width = label_left + label_height + label_base + pad
+    canvas_height = top + img_height + pad
+    canvas = np.full((canvas_height, canvas_width, 3), 255, dtype=np.uint8)
+    canvas[top:top + img_height, :img_width] = image
+
+    if title is not None:
+        origin = ((img_width - title_width) // 2, pad + title_height)
+        cv2.putText(canvas, title, origin, font, title_scale, (0, 0, 0), thickness, cv2.LINE_AA)
+
+    # Highest values on top
+    gradient = np.linspace(255, 0, img_height).astype(np.uint8).reshape(-1, 1)
+    bar = cv2.applyColorMap(gradient, cv2.COLORMAP_JET)
+    canvas[top:top + img_height, bar_left:bar_left + bar_width] = bar
+    cv2.rectangle(canvas, (bar_left, top), (bar_left + bar_width - 1, top + img_height - 1), (0, 0, 0), 1)
+
+    span = (max_val - min_val) or 1
+    for val, text in zip(tick_values, tick_labels):
+        y = top + int(round((1 - (val - min_val) / span) * (img_height - 1)))
+        cv2.line(canvas, (bar_left + bar_width, y), (bar_left + bar_width + tick_len, y), (0, 0, 0), 1)
+        cv2.putText(canvas, text, (labels_left, y + text_height // 2), font, font_scale, (0, 0, 0), thickness, cv2.LINE_AA)
+
+    # Draw the label horizontally and rotate it next to the colorbar
+    label_img = np.full((label_height + label_base, label_width, 3), 255, dtype=np.uint8)
+    cv2.putText(label_img, label, (0, label_height), font, font_scale, (0, 0, 0), thickness, cv2.LINE_AA)
+    label_img = cv2.rotate(label_img, cv2.ROTATE_90_COUNTERCLOCKWISE)[:img_height]
+    label_top = top + (img_height - label_img.shape[0]) // 2
+    canvas[label_top:label_top + label_img.shape[0], label_left:label_left + label_img.shape[1]] = label_img
+    return canvas
@@ -49,6 +49,9 @@ def remove_duplicate_elephants(df, threshold=0.1):
     """
     Removes duplicate elephant detections overlapping in camera 1 and 2 based on a distance threshold.
 
+    A camera 2 detection is removed when it and a camera 1 detection from the same timestamp are mutual
+    nearest neighbours closer than the threshold. All candidate pairs are built with one merge on `Date`.
+
     Parameters:
     - df (pandas.DataFrame): The dataframe containing elephant detections.
     - threshold (float, optional): The distance threshold for considering detections as duplicates.
@@ -56,73 +59,112 @@ def remove_duplicate_elephants(df, threshold=0.1):
     Returns:
     - pandas.DataFrame: The cleaned dataframe with duplicates removed.
     """
-    def calculate_distance(row1, row2):
-        """Calculate the Euclidean distance between two points."""
-        return np.linalg.norm(np.array([row1['X_center'], row1['Y_center']]) - np.array([row2['X_center'], row2['Y_center']]))
-
-    # Prepare a list to track indices to remove
-    indices_to_remove = []
-
-    for timestamp in df['Date'].unique():
-        cam1_entries = df[(df['Camera'] == 1) & (df['Date'] == timestamp)]
-        cam2_entries = df[(df['Camera'] == 2) & (df['Date'] == timestamp)]
-        
-        for index1, row1 in cam1_entries.iterrows():
-            for index2, row2 in cam2_entries.iterrows():
-                distance = calculate_distance(row1, row2)
-                
-                # If distance is within threshold, check mutual closeness
-                if distance < threshold:
-                    
-                    closest_to_cam1 = cam2_entries.apply(lambda row: calculate_distance(row, row1), axis=1).idxmin()
-                    # Find closest cam1 entry to current cam2 entry
-                    closest_to_cam2 = cam1_entries.apply(lambda row: calculate_distance(row, row2), axis=1).idxmin()
-                    # Check mutual closeness
-                    if closest_to_cam1 == index2 and closest_to_cam2 == index1:
-                        assert index2 not in indices_to_remove
-                        indices_to_remove.append(index2) 
-    df_cleaned = df.drop(indices_to_remove)
-    
+    cameras = df['Camera'].to_numpy()
+    valid = df['Date'].notna().to_numpy()
+    positions = np.arange(len(df))
+    cam1 = pd.DataFrame({'Date': df['Date'].to_numpy(), 'pos': positions,
+                         'x': df['X_center'].to_numpy(dtype=np.float64), 'y': df['Y_center'].to_numpy(dtype=np.float64)})
+    cam2 = cam1[(cameras == 2) & valid]
+    cam1 = cam1[(cameras == 1) & valid]
+
+    pairs = cam1.merge(cam2, on='Date', suffixes=('1', '2'))
+    if len(pairs) == 0:
+        return df.copy()
+    pos1, pos2 = pairs['pos1'].to_numpy(), pairs['pos2'].to_numpy()
+    dx = pairs['x1'].to_numpy() - pairs['x2'].to_numpy()
+    dy = pairs['y1'].to_numpy() - pairs['y2'].to_numpy()
+    distance = np.sqrt(dx * dx + dy * dy)
+
+    def nearest(owner, other):
+        # For every owner the closest other detection, ties go to the one that comes first in df
+        order = np.lexsort((other, distance, owner))
+        owner, other = owner[order], other[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = owner[1:] != owner[:-1]
+        closest = np.full(len(df), -1)
+        closest[owner[first]] = other[first]
+        return closest
+
+    closest_to_cam1 = nearest(pos1, pos2)
+    closest_to_cam2 = nearest(pos2, pos1)
+    mutual = (closest_to_cam1[pos1] == pos2) & (closest_to_cam2[pos2] == pos1)
+    indices_to_remove = np.unique(pos2[mutual & (distance < threshold)])
+
+    df_cleaned = df.drop(df.index[indices_to_remove])
     return df_cleaned
 
+def project_points(M, x, y):
+    """
+    Transforms many points at once using a given transformation matrix.
+
+    Parameters:
+    - M (numpy.ndarray): The transformation matrix.
+    - x (numpy.ndarray): The x-coordinates of the points.
+    - y (numpy.ndarray): The y-coordinates of the points.
+
+    Returns:
+    - tuple: Arrays with the transformed x and y coordinates.
+    """
+    points = np.stack([x, y], axis=-1).astype('float32').reshape(1, -1, 2)
+    if points.shape[1] == 0:
+        empty = np.empty(0, dtype='float32')
+        return empty, empty.copy()
+    points_out = cv2.perspectiveTransform(points, M)
+    return points_out[0, :, 0], points_out[0, :, 1]
+
 def project_df(df):
     """
     Projects data points from image coordinates to map coordinates.
 
+    Detections are grouped by camera and every group is projected with one call
+    of its homography, the output columns are allocated once.
+
     Parameters:
     - df (pandas.DataFrame): Dataframe containing the detection data with elephant coordinates.
 
     Returns:
     - pandas.DataFrame: New dataframe with projected map coordinates.
     """
-    df_proj = pd.DataFrame(columns=['Camera', 'Date', 'X_center', 'Y_center', 'Width', 'Height'])
-    for index, row in df.iterrows():
-        data = {}
-        data['Camera'] = row['Camera']
-        map_width, map_height = CAMERA_to_MAP[data['Camera']]
-        H = CAMERA_to_H[data['Camera']]
-        width_real = CAMERA_to_REAL[data['Camera']]
-        # print(width_real)
-        data['Date'] = row['Date']
-        x, y, width, height = row['X_center'], row['Y_center'], row['Width'], row['Height']
-        
-        x, y = x*IMG_WIDTH, y*IMG_HEIGHT
-        width, height = width*IMG_WIDTH, height*IMG_HEIGHT
-        # print(f'x, y, w, h = {x, y, width, height}')
-        x, y, width, height = shift(x, y, width, height, data['Camera'])
-            
-        x_proj, y_proj = transform_row(H, x, y)
-        # print(polygon)  
-        data['X_center'], data['Y_center'] = x_proj/map_width, y_proj/map_height
-        data['Width'], data['Height'] = get_size(map_width, map_height, width_real)
-        
-        df_proj = pd.concat([df_proj, pd.DataFrame([data])], ignore_index=True)
+    cameras = df['Camera'].to_numpy()
+    n = len(df)
+    x_proj = np.empty(n, dtype=np.float64)
+    y_proj = np.empty(n, dtype=np.float64)
+    width_proj = np.empty(n, dtype=np.float64)
+    height_proj = np.empty(n, dtype=np.float64)
+
+    for camera in np.unique(cameras):
+        mask = cameras == camera
+        map_width, map_height = CAMERA_to_MAP[camera]
+        H = CAMERA_to_H[camera]
+        width_real = CAMERA_to_REAL[camera]
+
+        x = df['X_center'].to_numpy(dtype=np.float64)[mask] * IMG_WIDTH
+        y = df['Y_center'].to_numpy(dtype=np.float64)[mask] * IMG_HEIGHT
+        width = df['Width'].to_numpy(dtype=np.float64)[mask] * IMG_WIDTH
+        height = df['Height'].to_numpy(dtype=np.float64)[mask] * IMG_HEIGHT
+        x, y, width, height = shift(x, y, width, height, camera)
+
+        x_cam, y_cam = project_points(H, x, y)
+        x_proj[mask], y_proj[mask] = x_cam / np.float32(map_width), y_cam / np.float32(map_height)
+        width_proj[mask], height_proj[mask] = get_size(map_width, map_height, width_real)
+
+    df_proj = pd.DataFrame({
+        'Camera': cameras,
+        'Date': df['Date'].to_numpy(),
+        'X_center': x_proj,
+        'Y_center': y_proj,
+        'Width': width_proj,
+        'Height': height_proj
+    })
     return df_proj
 
 def get_heatmap_new(df, camera, size):
     """
     Generates a heatmap for specified cameras within a dataframe.
 
+    Every detection adds 1 to its bounding box. The box corners are scattered into a difference
+    image which a 2D cumulative sum turns into the heatmap, so the cost does not depend on box sizes.
+
     Parameters:
     - df (pandas.DataFrame): The dataframe containing detection data.
     - camera (list): List of camera IDs for which to generate the heatmap.
@@ -135,24 +177,24 @@ def get_heatmap_new(df, camera, size):
 
     heatmap_width, heatmap_height = size
 
-    heatmap_img = np.zeros((heatmap_height, heatmap_width), dtype=np.float32)
-
-    # Function to apply intensity within the bounding box area
-    def apply_bounded_gaussian_heatmap(cx, cy, w, h, heatmap):
-        # Calculate the bounding box in pixel coordinates
-        left = int(max(0, cx - w/2))
-        right = int(min(heatmap_width-1, cx + w/2))
-        top = int(max(0, cy - h/2))
-        bottom = int(min(heatmap_height-1, cy + h/2))
-
-        if(left >= heatmap_width or right < 0) or (top >= heatmap_height or bottom < 0):
-            return
-        
-        value = 1
-        heatmap[top:bottom, left:right] += value
-
-    for _, row in df.iterrows():
-        cx, cy, w, h = row['X_center'] * heatmap_width, row['Y_center'] * heatmap_height, row['Width'] * heatmap_width, row['Height'] * heatmap_height
-        apply_bounded_gaussian_heatmap(cx, cy, w, h, heatmap_img)
-        
+    cx, cy = df['X_center'].to_numpy(dtype=np.float64) * heatmap_width, df['Y_center'].to_numpy(dtype=np.float64) * heatmap_height
+    w, h = df['Width'].to_numpy(dtype=np.float64) * heatmap_width, df['Height'].to_numpy(dtype=np.float64) * heatmap_height
+
+    # Calculate the bounding boxes in pixel coordinates, the right and bottom edges are exclusive
+    left = np.trunc(np.maximum(0, cx - w/2)).astype(np.int64)
+    right = np.trunc(np.minimum(heatmap_width-1, cx + w/2)).astype(np.int64)
+    top = np.trunc(np.maximum(0, cy - h/2)).astype(np.int64)
+    bottom = np.trunc(np.minimum(heatmap_height-1, cy + h/2)).astype(np.int64)
+
+    inside = (left < heatmap_width) & (right >= 0) & (top < heatmap_height) & (bottom >= 0)
+    non_empty = (right > left) & (bottom > top)
+    keep = inside & non_empty
+    left, right, top, bottom = left[keep], right[keep], top[keep], bottom[keep]
+
+    stride = heatmap_width + 1
+    corners = np.concatenate([top*stride + left, top*stride + right, bottom*stride + left, bottom*stride + right])
+    deltas = np.repeat(np.array([1, -1, -1, 1], dtype=np.float64), len(left))
+    diff = np.bincount(corners, weights=deltas, minlength=(heatmap_height+1)*stride).reshape(heatmap_height+1, stride)
+
+    heatmap_img = diff.cumsum(axis=0).cumsum(axis=1)[:heatmap_height, :heatmap_width].astype(np.float32)
     return heatmap_img
@@ -1,50 +1,363 @@
 import pandas as pd
+import numpy as np
 import os
 import re
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from visualize.tracking import track_positions, NO_TRACK
 
-PATTERN = re.compile(r'screenshot(\d+)_(\d{2})_(\d{2})__(\d{2})_(\d{2})\.txt')
+NAME_PATTERN = re.compile(r'screenshot(\d+)_(\d{2})_(\d{2})__(\d{2})_(\d{2})')
+PATTERN = re.compile(NAME_PATTERN.pattern + r'\.txt')
 # df = pd.DataFrame(columns=['Camera', 'Date', 'X_center', 'Y_center', 'Width', 'Height'])
 NUMERIC_COLS = ['Camera', 'X_center', 'Y_center', 'Width', 'Height']
+BOX_COLS = ['X_center', 'Y_center', 'Width', 'Height']
+MANIFEST_COLS = ['Name', 'Mtime', 'Size', 'Rows']
+MINUTES = ['00', '15', '30', '45']
+TIME_SHIFT = np.timedelta64(1, 'h')
 
-def read_positions(label_dir='../../data_all/labels', output_csv='positions.csv'):
+def parse_label_file(path):
+    """
+    Parses one YOLO label file named after the screenshot it belongs to.
+
+    Parameters:
+    - path (str): Path to the label file.
+
+    Returns:
+    - tuple: Camera number, timestamp (numpy.datetime64) and an (N, 4) array of boxes.
+    """
+    name = os.path.basename(path)
+    assert name.endswith('.txt')
+    camera, timestamp = parse_name(name)
+    with open(path) as file:
+        values = np.array(file.read().split(), dtype=np.float64)
+    boxes = values.reshape(-1, 5)[:, 1:]
+    return camera, timestamp, boxes
+
+def parse_name(name):
+    """
+    Reads camera and capture time from a screenshot or label name such as screenshot4_21_02__10_15.
+
+    Parameters:
+    - name (str): File name or stem.
+
+    Returns:
+    - tuple: Camera number and timestamp (numpy.datetime64), without `TIME_SHIFT`.
+    """
+    match = NAME_PATTERN.match(name)
+    assert match
+    camera, day, month, hour, minute = map(int, match.groups())
+    return camera, np.datetime64(datetime(year=2024, month=month, day=day, hour=hour, minute=minute), 'ns')
+
+def scan_label_files(label_dir):
+    """
+    Lists label files captured at the quarter-hour grid together with their modification time and size.
+
+    Parameters:
+    - label_dir (str): Path to annotation labels.
+
+    Returns:
+    - pandas.DataFrame: Manifest with columns Name, Mtime and Size.
+    """
+    names, mtimes, sizes = [], [], []
+    with os.scandir(label_dir) as entries:
+        for entry in entries:
+            ending = os.path.splitext(entry.name)[0][-2:]
+            if ending not in MINUTES:
+                continue
+            stat = entry.stat()
+            names.append(entry.name)
+            mtimes.append(stat.st_mtime)
+            sizes.append(stat.st_size)
+    return pd.DataFrame({'Name': np.array(names, dtype=str),
+                         'Mtime': np.array(mtimes, dtype=np.float64),
+                         'Size': np.array(sizes, dtype=np.int64)})
+
+def parse_label_files(paths, workers=None):
+    """
+    Parses label files in parallel and collects the detections into one dataframe.
+
+    Parameters:
+    - paths (list): Paths to the label files.
+    - workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    - pandas.DataFrame: Detections with typed columns, in the order of `paths`.
+    - numpy.ndarray: Number of detections read from each file.
+    """
+    chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+    if len(paths) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(parse_label_file, paths, chunksize=chunksize))
+    else:
+        parsed = [parse_label_file(path) for path in paths]
+
+    rows = np.array([len(boxes) for _, _, boxes in parsed], dtype=np.int64)
+    total = rows.sum()
+    cameras = np.empty(total, dtype=np.int64)
+    dates = np.empty(total, dtype='datetime64[ns]')
+    boxes_all = np.empty((total, 4), dtype=np.float64)
+    start = 0
+    for camera, timestamp, boxes in parsed:
+        end = start + len(boxes)
+        cameras[start:end] = camera
+        dates[start:end] = timestamp
+        boxes_all[start:end] = boxes
+        start = end
+    return positions_frame(cameras, dates + TIME_SHIFT, boxes_all), rows
+
+def positions_frame(cameras, dates, boxes):
+    """
+    Builds a positions dataframe with categorical cameras and datetime dates.
+
+    Parameters:
+    - cameras (numpy.ndarray): Camera numbers.
+    - dates (numpy.ndarray): Detection timestamps.
+    - boxes (numpy.ndarray): (N, 4) array of X_center, Y_center, Width, Height.
+
+    Returns:
+    - pandas.DataFrame: The positions dataframe.
+    """
+    df = pd.DataFrame({
+        'Camera': pd.Categorical(cameras, categories=np.unique(cameras)),
+        'Date': np.asarray(dates, dtype='datetime64[ns]')
+    })
+    for i, col in enumerate(BOX_COLS):
+        df[col] = boxes[:, i]
+    return df
+
+def detection_positions(names, boxes):
+    """
+    Builds a positions dataframe from detections on screenshots, as `parse_label_files` does from their labels.
+
+    Parameters:
+    - names (list): Screenshot names such as screenshot4_21_02__10_15.png.
+    - boxes (list): (N, 4) arrays of normalized X_center, Y_center, Width, Height, one per screenshot.
+
+    Returns:
+    - pandas.DataFrame: The positions dataframe.
+    """
+    cameras, dates = [], []
+    for name, frame_boxes in zip(names, boxes):
+        camera, timestamp = parse_name(os.path.basename(name))
+        cameras.append(np.full(len(frame_boxes), camera, dtype=np.int64))
+        dates.append(np.full(len(frame_boxes), timestamp, dtype='datetime64[ns]'))
+    boxes = [np.asarray(frame_boxes, dtype=np.float64).reshape(-1, 4) for frame_boxes in boxes]
+    if not boxes:
+        return positions_frame(np.zeros(0, dtype=np.int64), np.zeros(0, dtype='datetime64[ns]'), np.zeros((0, 4)))
+    return positions_frame(np.concatenate(cameras), np.concatenate(dates) + TIME_SHIFT, np.concatenate(boxes))
+
+def save_positions(df, output_npz, manifest=None):
+    """
+    Stores a positions dataframe in a NumPy .npz file.
+
+    Parameters:
+    - df (pandas.DataFrame): The positions dataframe.
+    - output_npz (str): Path to output .npz file.
+    - manifest (pandas.DataFrame, optional): Ingested label files with columns Name, Mtime, Size and Rows,
+      in the order their rows appear in `df`.
+    """
+    arrays = {}
+    if manifest is not None:
+        arrays = {'manifest_' + col.lower(): manifest[col].to_numpy() for col in MANIFEST_COLS}
+        arrays['manifest_name'] = manifest['Name'].to_numpy(dtype=str)
+    if 'Track' in df:
+        arrays['track'] = df['Track'].to_numpy(dtype=np.int64)
+    np.savez(output_npz,
+             camera=np.asarray(df['Camera'], dtype=np.int64),
+             date=df['Date'].to_numpy(dtype='datetime64[ns]'),
+             boxes=df[BOX_COLS].to_numpy(dtype=np.float64),
+             **arrays)
+
+def load_positions(output_npz, with_manifest=False):
+    """
+    Loads a positions dataframe stored by `save_positions`.
+
+    Parameters:
+    - output_npz (str): Path to the .npz file.
+    - with_manifest (bool, optional): Whether to also return the manifest of ingested label files.
+
+    Returns:
+    - pandas.DataFrame: The positions dataframe.
+    - pandas.DataFrame: The manifest or None if it was not stored, only when `with_manifest` is True.
+    """
+    with np.load(output_npz) as data:
+        df = positions_frame(data['camera'], data['date'], data['boxes'])
+        if 'track' in data:
+            df['Track'] = data['track']
+        if not with_manifest:
+            return df
+        manifest = None
+        if 'manifest_name' in data:
+            manifest = pd.DataFrame({col: data['manifest_' + col.lower()] for col in MANIFEST_COLS})
+        return df, manifest
+
+def append_positions(df_new, output_csv):
+    """
+    Appends positions to the csv file and, if it is up to date, to its .npz copy without parsing label files.
+
+    The appended rows are recorded in the manifest as a block of their own, which no label file replaces,
+    so later incremental reads keep them.
+
+    Parameters:
+    - df_new (pandas.DataFrame): Positions to append, as built by `positions_frame`.
+    - output_csv (str): Path to the csv file.
+    """
+    npz_file = os.path.splitext(output_csv)[0] + '.npz'
+    csv_exists = os.path.exists(output_csv)
+    update_npz = not csv_exists or (os.path.exists(npz_file) and os.path.getmtime(npz_file) >= os.path.getmtime(output_csv))
+    rows = df_new[['Camera', 'Date'] + BOX_COLS].copy()
+    if csv_exists and 'Track' in pd.read_csv(output_csv, nrows=0).columns:
+        # Appended rows are not tracked yet
+        rows['Track'] = NO_TRACK
+    rows.to_csv(output_csv, mode='a', header=not csv_exists, index=False)
+    if not update_npz:
+        return
+    # Written after the csv, so the .npz stays at least as new as the csv
+    block = pd.DataFrame({'Name': [f'<appended {time.time_ns()}>'], 'Mtime': [time.time()], 'Size': [0], 'Rows': [len(df_new)]})
+    if not csv_exists:
+        save_positions(positions_frame(np.asarray(df_new['Camera'], dtype=np.int64), df_new['Date'].to_numpy(dtype='datetime64[ns]'),
+                                       df_new[BOX_COLS].to_numpy(dtype=np.float64)), npz_file, block)
+        return
+    df, manifest = load_positions(npz_file, with_manifest=True)
+    merged = positions_frame(np.concatenate([np.asarray(df['Camera'], dtype=np.int64), np.asarray(df_new['Camera'], dtype=np.int64)]),
+                             np.concatenate([df['Date'].to_numpy(dtype='datetime64[ns]'), df_new['Date'].to_numpy(dtype='datetime64[ns]')]),
+                             np.concatenate([df[BOX_COLS].to_numpy(dtype=np.float64), df_new[BOX_COLS].to_numpy(dtype=np.float64)]))
+    if 'Track' in df:
+        merged['Track'] = np.concatenate([df['Track'].to_numpy(dtype=np.int64), np.full(len(df_new), NO_TRACK, dtype=np.int64)])
+    if manifest is not None:
+        manifest = pd.concat([manifest, block], ignore_index=True)
+    save_positions(merged, npz_file, manifest)
+
+def ingest_labels(label_dir, workers=None):
+    """
+    Parses all label files in a directory.
+
+    Parameters:
+    - label_dir (str): Path to annotation labels.
+    - workers (int, optional): Number of processes used to parse the labels.
+
+    Returns:
+    - pandas.DataFrame: The positions dataframe.
+    - pandas.DataFrame: Manifest of the parsed label files.
+    """
+    manifest = scan_label_files(label_dir)
+    paths = [os.path.join(label_dir, name) for name in manifest['Name']]
+    df, manifest['Rows'] = parse_label_files(paths, workers=workers)
+    return df, manifest
+
+def update_positions(df, manifest, label_dir, workers=None):
+    """
+    Appends detections from new or changed label files to a positions dataframe.
+
+    Rows of a changed file are replaced by its new content, files that disappeared keep their rows.
+
+    Parameters:
+    - df (pandas.DataFrame): The positions dataframe.
+    - manifest (pandas.DataFrame): Manifest of the label files already in `df`.
+    - label_dir (str): Path to annotation labels.
+    - workers (int, optional): Number of processes used to parse the labels.
+
+    Returns:
+    - pandas.DataFrame: The updated positions dataframe.
+    - pandas.DataFrame: The updated manifest.
+    - int: Number of parsed label files.
+    """
+    current = scan_label_files(label_dir)
+    merged = current.merge(manifest, on='Name', how='left', suffixes=('', '_old'))
+    is_new = merged['Rows'].isna().to_numpy()
+    changed = ~is_new & ((merged['Mtime'] != merged['Mtime_old']) | (merged['Size'] != merged['Size_old'])).to_numpy()
+    todo = current[is_new | changed].reset_index(drop=True)
+    if len(todo) == 0:
+        return df, manifest, 0
+
+    # Every file owns a contiguous block of rows, drop the blocks of changed files
+    keep_files = ~manifest['Name'].isin(todo['Name']).to_numpy()
+    keep_rows = np.repeat(keep_files, manifest['Rows'].to_numpy())
+    paths = [os.path.join(label_dir, name) for name in todo['Name']]
+    df_new, todo['Rows'] = parse_label_files(paths, workers=workers)
+
+    df = positions_frame(np.concatenate([np.asarray(df['Camera'], dtype=np.int64)[keep_rows], np.asarray(df_new['Camera'], dtype=np.int64)]),
+                         np.concatenate([df['Date'].to_numpy(dtype='datetime64[ns]')[keep_rows], df_new['Date'].to_numpy(dtype='datetime64[ns]')]),
+                         np.concatenate([df[BOX_COLS].to_numpy(dtype=np.float64)[keep_rows], df_new[BOX_COLS].to_numpy(dtype=np.float64)]))
+    manifest = pd.concat([manifest[keep_files], todo[MANIFEST_COLS]], ignore_index=True)
+    return df, manifest, len(todo)
+
+def read_positions(label_dir='../../data_all/labels', output_csv='positions.csv', workers=None, incremental=False, track=False):
     """
     Reads elephant labels into a csv file if not available, otherwise return it.
+    A binary .npz copy is kept next to the csv file and used on later calls.
     Parameters:
     - label_dir (str): Path to annotation labals.
     - output_csv (str): Path to output csv file.
+    - workers (int, optional): Number of processes used to parse the labels.
+    - incremental (bool, optional): Parse label files that are new or changed since the last call and append them
+      to the stored positions instead of returning them unchanged. The positions file has to be created by
+      an incremental read or `append_positions`, other files are refused.
+    - track (bool, optional): Link detections of consecutive frames by `track_positions` and store the track IDs
+      in a Track column.
     """
-    df = pd.DataFrame(columns=['Camera', 'Date', 'X_center', 'Y_center', 'Width', 'Height'])
     csv_file = output_csv
+    npz_file = os.path.splitext(csv_file)[0] + '.npz'
+    if incremental:
+        if not os.path.exists(csv_file) and not os.path.exists(npz_file):
+            df, manifest = ingest_labels(label_dir, workers=workers)
+            return store_positions(df, csv_file, npz_file, manifest, track)
+        manifest = None
+        if os.path.exists(npz_file) and (not os.path.exists(csv_file) or os.path.getmtime(npz_file) >= os.path.getmtime(csv_file)):
+            df, manifest = load_positions(npz_file, with_manifest=True)
+        if manifest is None:
+            # Re-ingesting the labels would overwrite rows that did not come from them
+            raise Exception(f'{csv_file} was not written by an incremental read, nothing records which label files it contains. '
+                            f'Read the labels incrementally into a new file.')
+        else:
+            df, manifest, parsed = update_positions(df, manifest, label_dir, workers=workers)
+            if parsed == 0 and (not track or ('Track' in df and (df['Track'] != NO_TRACK).all())):
+                return df
+        return store_positions(df, csv_file, npz_file, manifest, track)
+
+    if os.path.exists(npz_file) and (not os.path.exists(csv_file) or os.path.getmtime(npz_file) >= os.path.getmtime(csv_file)):
+        df, manifest = load_positions(npz_file, with_manifest=True)
+        if track and ('Track' not in df or (df['Track'] == NO_TRACK).any()):
+            return store_positions(df, csv_file, npz_file, manifest, track)
+        return df
+
     if os.path.exists(csv_file):
         df = pd.read_csv(csv_file)
         for col in NUMERIC_COLS:
             df[col] = pd.to_numeric(df[col])
         df['Date'] = pd.to_datetime(df['Date'])
+        tracks = df['Track'].to_numpy(dtype=np.int64) if 'Track' in df else None
+        df = positions_frame(df['Camera'].to_numpy(), df['Date'].to_numpy(), df[BOX_COLS].to_numpy(dtype=np.float64))
+        if tracks is not None and not (track and (tracks == NO_TRACK).any()):
+            df['Track'] = tracks
+        elif track:
+            return store_positions(df, csv_file, npz_file, None, track)
+        save_positions(df, npz_file)
         return df
-    
-    for filename in os.listdir(label_dir):
-        ending = os.path.splitext(filename)[0][-2:]
-        if ending not in ['00', '15', '30', '45']:
-            continue
-        path = os.path.join(label_dir, filename)
-        match = PATTERN.match(filename)
-        assert match
-        camera, day, month, hour, minute = map(int, match.groups())
-        # Convert to datetime object
-        data = {}
-        timestamp = pd.Timestamp(year=2024, month=month, day=day, hour=hour, minute=minute)
-        with open(path) as file:
-            for item in file:
-                _, x_center, y_center, width, height = item.strip().split()
-                data['X_center'], data['Y_center'], data['Width'], data['Height'] = x_center, y_center, width, height
-                data['Camera'] = camera
-                data['Date'] = pd.to_datetime(timestamp)
-                df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
-    for col in NUMERIC_COLS:
-        df[col] = pd.to_numeric(df[col])
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Date'] = df['Date'] + pd.Timedelta(hours=1)
-    if not os.path.exists(csv_file):
-        df.to_csv(csv_file, index=False)
-    return df
\ No newline at end of file
+
+    df, manifest = ingest_labels(label_dir, workers=workers)
+    return store_positions(df, csv_file, npz_file, manifest, track)
+
+def store_positions(df, csv_file, npz_file, manifest, track):
+    """
+    Writes positions to the csv file and its .npz copy, tracking them first if requested.
+
+    Parameters:
+    - df (pandas.DataFrame): The positions dataframe.
+    - csv_file (str): Path to the csv file.
+    - npz_file (str): Path to the .npz file.
+    - manifest (pandas.DataFrame): Manifest of the parsed label files or None.
+    - track (bool): Recompute the Track column.
+
+    Returns:
+    - pandas.DataFrame: The stored positions dataframe.
+    """
+    if track:
+        df['Track'] = track_positions(df)
+    elif 'Track' in df:
+        # Rows changed since the tracks were computed
+        df = df.drop(columns='Track')
+    df.to_csv(csv_file, index=False)
+    save_positions(df, npz_file, manifest)
+    return df
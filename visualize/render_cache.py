@@ -0,0 +1,209 @@
+import os
+import uuid
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+import cv2
+
+DATA_COLS = ['Camera', 'X_center', 'Y_center', 'Width', 'Height']
+CACHE_VERSION = 1
+
+
+def hash_data(df, columns=DATA_COLS):
+    """
+    Hashes the columns of a dataframe that heatmaps are built from, independently of the row order.
+
+    Parameters:
+    - df (DataFrame): Data containing coordinates and camera information.
+    - columns (list, optional): Columns to hash.
+
+    Returns:
+    - (str): Hex digest of the data.
+    """
+    data = df[columns].astype({'Camera': np.int64})
+    row_hashes = np.sort(pd.util.hash_pandas_object(data, index=False).to_numpy())
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+
+def hash_arrays(*arrays):
+    """
+    Hashes the content, shape and dtype of numpy arrays.
+
+    Parameters:
+    - arrays (*args): Arrays to hash.
+
+    Returns:
+    - (str): Hex digest of the arrays.
+    """
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f'{array.shape}{array.dtype}'.encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+def hash_files(*paths):
+    """
+    Hashes the paths, sizes and modification times of files, e.g. the map images a render depends on.
+
+    Parameters:
+    - paths (*args): Paths to the files.
+
+    Returns:
+    - (str): Hex digest of the file identities.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path) if os.path.exists(path) else None
+        digest.update(f'{path}:{stat and stat.st_size}:{stat and stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """A size-bounded LRU cache of rendered heatmap images stored on disk, shared by processes using the same directory."""
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        """
+        Initializes the RenderCache.
+
+        Parameters:
+        - cache_dir (str): Directory where the cached images are stored.
+        - max_bytes (int, optional): Maximum total size of the cached images, least recently used ones are evicted.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """
+        Builds a cache key from hashes and rendering parameters.
+
+        Parameters:
+        - parts (*args): Values identifying the render, converted with repr.
+
+        Returns:
+        - (str): The cache key.
+        """
+        return hashlib.sha1(repr((CACHE_VERSION,) + parts).encode()).hexdigest()
+
+    def path(self, key):
+        """
+        Returns the path of a cache entry.
+
+        Parameters:
+        - key (str): The cache key.
+        """
+        return os.path.join(self.cache_dir, f'{key}.png')
+
+    def get_file(self, key, save_path):
+        """
+        Copies a cached image to a given path.
+
+        Parameters:
+        - key (str): The cache key.
+        - save_path (str): Where the image should be stored.
+
+        Returns:
+        - (bool): True on a cache hit.
+        """
+        path = self.path(key)
+        try:
+            shutil.copyfile(path, save_path)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def get_image(self, key):
+        """
+        Reads a cached image.
+
+        Parameters:
+        - key (str): The cache key.
+
+        Returns:
+        - (numpy.ndarray): The image or None on a cache miss.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+    def put_file(self, key, src_path):
+        """
+        Stores a rendered image file in the cache.
+
+        Parameters:
+        - key (str): The cache key.
+        - src_path (str): Path to the rendered image.
+        """
+        tmp_path = os.path.join(self.cache_dir, f'.{uuid.uuid4().hex}.tmp')
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def put_image(self, key, img):
+        """
+        Stores a rendered image in the cache as a lossless png.
+
+        Parameters:
+        - key (str): The cache key.
+        - img (numpy.ndarray): The image.
+        """
+        tmp_path = os.path.join(self.cache_dir, f'.{uuid.uuid4().hex}.tmp')
+        _, data = cv2.imencode('.png', img)
+        with open(tmp_path, 'wb') as f:
+            f.write(data.tobytes())
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used images until the cache fits into `max_bytes`.
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.png'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                # Already evicted by another process
+                pass
+            total -= size
+
+    def stats(self):
+        """
+        Returns hit and miss statistics of this cache instance.
+
+        Returns:
+        - (dict): Numbers of hits, misses and evictions and the hit rate.
+        """
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0.0}
@@ -0,0 +1,151 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+FRAME_MINUTES = 15
+MEASUREMENT_NOISE = 0.02 ** 2
+PROCESS_NOISE = 0.01 ** 2
+NO_TRACK = -1
+
+
+class KalmanTrack:
+    """A constant-velocity Kalman filter of a box centre in normalized image coordinates, time is measured in frames."""
+
+    def __init__(self, track_id, box, time):
+        """
+        Initializes the KalmanTrack.
+
+        Parameters:
+        - track_id (int): Identifier of the track.
+        - box (numpy.ndarray): First box as X_center, Y_center, Width, Height.
+        - time (float): Time of the first box in frames.
+        """
+        self.track_id = track_id
+        self.state = np.array([box[0], box[1], 0.0, 0.0])
+        self.covariance = np.diag([MEASUREMENT_NOISE, MEASUREMENT_NOISE, 1e-3, 1e-3])
+        self.size = box[2:4].copy()
+        self.time = time
+
+    def predict(self, time):
+        """
+        Returns the box expected at a given time without changing the filter.
+
+        Parameters:
+        - time (float): Time in frames.
+
+        Returns:
+        - (numpy.ndarray): Predicted X_center, Y_center, Width, Height.
+        """
+        dt = time - self.time
+        return np.array([self.state[0] + dt * self.state[2], self.state[1] + dt * self.state[3], *self.size])
+
+    def update(self, box, time):
+        """
+        Moves the filter to a given time and corrects it with a matched box.
+
+        Parameters:
+        - box (numpy.ndarray): Matched X_center, Y_center, Width, Height.
+        - time (float): Time of the box in frames.
+        """
+        dt = time - self.time
+        F = np.array([[1, 0, dt, 0], [0, 1, 0, dt], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=np.float64)
+        H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=np.float64)
+        state = F @ self.state
+        covariance = F @ self.covariance @ F.T + PROCESS_NOISE * dt * np.eye(4)
+        innovation = box[:2] - H @ state
+        S = H @ covariance @ H.T + MEASUREMENT_NOISE * np.eye(2)
+        K = covariance @ H.T @ np.linalg.inv(S)
+        self.state = state + K @ innovation
+        self.covariance = (np.eye(4) - K @ H) @ covariance
+        self.size = box[2:4].copy()
+        self.time = time
+
+
+def box_iou(boxes1, boxes2):
+    """
+    Computes IoU between two sets of boxes given by centre and size.
+
+    Parameters:
+    - boxes1 (numpy.ndarray): (N, 4) boxes as X_center, Y_center, Width, Height.
+    - boxes2 (numpy.ndarray): (M, 4) boxes in the same format.
+
+    Returns:
+    - (numpy.ndarray): (N, M) IoU matrix.
+    """
+    a = np.concatenate([boxes1[:, :2] - boxes1[:, 2:] / 2, boxes1[:, :2] + boxes1[:, 2:] / 2], axis=1)[:, None]
+    b = np.concatenate([boxes2[:, :2] - boxes2[:, 2:] / 2, boxes2[:, :2] + boxes2[:, 2:] / 2], axis=1)[None]
+    w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = w * h
+    union = boxes1[:, None, 2] * boxes1[:, None, 3] + boxes2[None, :, 2] * boxes2[None, :, 3] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def track_positions(df, iou_threshold=0.1, max_gap=np.timedelta64(30, 'm')):
+    """
+    Links detections of consecutive frames of each camera into tracks.
+
+    Tracks are predicted to the time of every frame and matched to its detections by the Hungarian
+    algorithm on their IoU. Tracks not matched for longer than `max_gap` end.
+
+    Parameters:
+    - df (pandas.DataFrame): Positions in image coordinates with Camera and Date columns.
+    - iou_threshold (float, optional): Minimal IoU of a predicted track box and a detection to link them.
+    - max_gap (numpy.timedelta64, optional): Longest time a track can miss detections.
+
+    Returns:
+    - numpy.ndarray: Track ID of every row of `df`, unique over all cameras.
+    """
+    track_ids = np.full(len(df), NO_TRACK, dtype=np.int64)
+    cameras = np.asarray(df['Camera'], dtype=np.int64)
+    dates = df['Date'].to_numpy(dtype='datetime64[ns]')
+    boxes = df[['X_center', 'Y_center', 'Width', 'Height']].to_numpy(dtype=np.float64)
+    frame_length = np.timedelta64(FRAME_MINUTES, 'm')
+    max_gap_frames = max_gap / frame_length
+    next_id = 0
+    order = np.lexsort((dates, cameras))
+    # Rows of one frame are contiguous in `order`
+    starts = np.flatnonzero(np.r_[True, (cameras[order][1:] != cameras[order][:-1]) | (dates[order][1:] != dates[order][:-1])])
+    ends = np.r_[starts[1:], len(order)]
+    active = []
+    camera = None
+    for start, end in zip(starts, ends):
+        rows = order[start:end]
+        if cameras[rows[0]] != camera:
+            camera = cameras[rows[0]]
+            active = []
+        time = (dates[rows[0]] - np.datetime64(0, 'ns')) / frame_length
+        active = [track for track in active if time - track.time <= max_gap_frames]
+        detections = boxes[rows]
+        matched = set()
+        if active:
+            predicted = np.stack([track.predict(time) for track in active])
+            iou = box_iou(predicted, detections)
+            for t, d in zip(*linear_sum_assignment(-iou)):
+                if iou[t, d] >= iou_threshold:
+                    active[t].update(detections[d], time)
+                    track_ids[rows[d]] = active[t].track_id
+                    matched.add(d)
+        for d in range(len(rows)):
+            if d not in matched:
+                active.append(KalmanTrack(next_id, detections[d], time))
+                track_ids[rows[d]] = next_id
+                next_id += 1
+    return track_ids
+
+
+def track_summary(df):
+    """
+    Summarizes tracks of a positions dataframe with a Track column.
+
+    Parameters:
+    - df (pandas.DataFrame): Positions with Camera, Date and Track columns.
+
+    Returns:
+    - pandas.DataFrame: One row per track with its camera, first and last date, number of detections
+      and dwell time, the time between its first and last detection.
+    """
+    tracked = df[df['Track'] != NO_TRACK]
+    summary = tracked.groupby('Track').agg(Camera=('Camera', 'first'), Start=('Date', 'min'),
+                                           End=('Date', 'max'), Detections=('Date', 'size'))
+    summary['Dwell'] = summary['End'] - summary['Start']
+    return summary.reset_index()